@@ -0,0 +1,93 @@
+"""NumPy向量化四柱计算
+
+一次处理整段时间序列（如数十年间逐小时的时刻），全程只做整数数组运算：
+年柱、月柱由节气时刻表二分定位，日柱由距EPOCH的天数取模，
+时柱由真太阳时与日干推出。只有最后一步才把下标映射为天干地支字符。
+
+    import numpy as np
+    ts = np.arange('2000-01-01T00:00', '2000-01-02T00:00', np.timedelta64(1, 'h'), dtype='datetime64[m]')
+    pillars = four_pillars(ts, 116.4)
+    to_ganzhi(pillars['year_stem'], pillars['year_branch'])
+"""
+try:
+    import numpy as np
+except ImportError as e:  # numpy仅分析任务需要，线上接口不依赖
+    raise ImportError('bazi_array需要numpy，请先执行 pip install numpy') from e
+
+from bazi_with_sxtwl import DIZHI, TIANGAN
+from jieqi import EPOCH, MONTH_GZ_OFFSET, YEAR_GZ_OFFSET, get_jie_table
+
+PILLARS = ('year', 'month', 'day', 'hour')
+
+_EPOCH64 = np.datetime64(EPOCH, 'm')
+# EPOCH当日（1900-01-01 甲戌）的六十甲子序号
+_EPOCH_DAY_GZ = 10
+
+_TIANGAN_ARRAY = np.array(TIANGAN)
+_DIZHI_ARRAY = np.array(DIZHI)
+
+
+def _minutes_since_epoch(timestamps):
+    """datetime64数组（北京时间）转换为距EPOCH的整数分钟"""
+    ts = np.asarray(timestamps, dtype='datetime64[m]')
+    return (ts - _EPOCH64).astype(np.int64)
+
+
+def four_pillars(timestamps, longitudes, table=None):
+    """计算四柱的天干、地支下标数组
+
+    timestamps为北京时间的datetime64数组，longitudes为同形状（或可广播）的经度。
+    返回 {'year_stem', 'year_branch', ..., 'hour_branch'} 八个int8数组，
+    天干0-9对应TIANGAN，地支0-11对应DIZHI。
+    """
+    table = table or get_jie_table()
+    jie_minutes = np.frombuffer(table.minutes, dtype=np.int32)
+
+    minutes = _minutes_since_epoch(timestamps)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    minutes, longitudes = np.broadcast_arrays(minutes, longitudes)
+
+    # 年柱、月柱：定位所在的节
+    jie_index = np.searchsorted(jie_minutes, minutes, side='right') - 1
+    if minutes.size and (jie_index.min() < 0 or jie_index.max() >= len(jie_minutes) - 1):
+        raise ValueError(f'时间超出节气表范围（{table.start_year}-{table.end_year}年）')
+    year = table.start_year + jie_index // 12
+    year_gz = (year - YEAR_GZ_OFFSET) % 60
+    month_gz = (12 * year + jie_index % 12 + MONTH_GZ_OFFSET) % 60
+
+    # 日柱：按公历日计
+    days = minutes // 1440
+    day_gz = (days + _EPOCH_DAY_GZ) % 60
+    day_stem = day_gz % 10
+
+    # 时柱：真太阳时（简化校正，与calculate_bazi一致），23点起用次日日干推时干
+    true_minutes = minutes + longitudes * 4 - 120 * 4
+    true_hour = (np.floor(true_minutes / 60) % 24).astype(np.int64)
+    hour_index = (true_hour + 1) // 2
+    hour_stem = (day_stem * 2 + hour_index) % 10
+    hour_branch = hour_index % 12
+
+    return {
+        'year_stem': (year_gz % 10).astype(np.int8),
+        'year_branch': (year_gz % 12).astype(np.int8),
+        'month_stem': (month_gz % 10).astype(np.int8),
+        'month_branch': (month_gz % 12).astype(np.int8),
+        'day_stem': day_stem.astype(np.int8),
+        'day_branch': (day_gz % 12).astype(np.int8),
+        'hour_stem': hour_stem.astype(np.int8),
+        'hour_branch': hour_branch.astype(np.int8),
+    }
+
+
+def to_ganzhi(stems, branches):
+    """天干、地支下标数组映射为“甲子”形式的字符串数组"""
+    return np.char.add(_TIANGAN_ARRAY[stems], _DIZHI_ARRAY[branches])
+
+
+def four_pillars_str(timestamps, longitudes, table=None):
+    """计算四柱并映射为字符串数组，返回 {'year': ..., 'month': ..., 'day': ..., 'hour': ...}"""
+    pillars = four_pillars(timestamps, longitudes, table)
+    return {
+        name: to_ganzhi(pillars[f'{name}_stem'], pillars[f'{name}_branch'])
+        for name in PILLARS
+    }
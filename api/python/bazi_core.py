@@ -0,0 +1,334 @@
+"""八字核心数据层
+
+天干以0-9、地支以0-11、干支以六十甲子序号0-59表示，十神、纳音、藏干等
+均预先展开为按下标访问的表。计算全程使用整数，只在输出时映射为汉字。
+"""
+from collections import namedtuple
+
+# 天干地支名称
+TIANGAN = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
+DIZHI = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
+
+# 五行属性
+WUXING = ["木", "火", "土", "金", "水"]
+
+# 天干五行对应
+TIANGAN_WUXING = {
+    "甲": "木", "乙": "木", 
+    "丙": "火", "丁": "火", 
+    "戊": "土", "己": "土", 
+    "庚": "金", "辛": "金", 
+    "壬": "水", "癸": "水"
+}
+
+# 地支藏干（按照主气、中气、余气排序）
+DIZHI_CANGGAN = {
+    "子": ["癸"],
+    "丑": ["己", "辛", "癸"],
+    "寅": ["甲", "丙", "戊"],
+    "卯": ["乙"],
+    "辰": ["戊", "乙", "癸"],
+    "巳": ["丙", "庚", "戊"],
+    "午": ["丁", "己"],
+    "未": ["己", "丁", "乙"],
+    "申": ["庚", "壬", "戊"],
+    "酉": ["辛"],
+    "戌": ["戊", "辛", "丁"],
+    "亥": ["壬", "甲"]
+}
+
+# 十神名称
+SHISHEN = ["比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印"]
+
+# 纳音五行
+NAYIN = {
+    "甲子": "海中金", "乙丑": "海中金",
+    "丙寅": "炉中火", "丁卯": "炉中火",
+    "戊辰": "大林木", "己巳": "大林木",
+    "庚午": "路旁土", "辛未": "路旁土",
+    "壬申": "剑锋金", "癸酉": "剑锋金",
+    "甲戌": "山头火", "乙亥": "山头火",
+    "丙子": "涧下水", "丁丑": "涧下水",
+    "戊寅": "城头土", "己卯": "城头土",
+    "庚辰": "白蜡金", "辛巳": "白蜡金",
+    "壬午": "杨柳木", "癸未": "杨柳木",
+    "甲申": "泉中水", "乙酉": "泉中水",
+    "丙戌": "屋上土", "丁亥": "屋上土",
+    "戊子": "霹雳火", "己丑": "霹雳火",
+    "庚寅": "松柏木", "辛卯": "松柏木",
+    "壬辰": "长流水", "癸巳": "长流水",
+    "甲午": "沙中金", "乙未": "沙中金",
+    "丙申": "山下火", "丁酉": "山下火",
+    "戊戌": "平地木", "己亥": "平地木",
+    "庚子": "壁上土", "辛丑": "壁上土",
+    "壬寅": "金箔金", "癸卯": "金箔金",
+    "甲辰": "覆灯火", "乙巳": "覆灯火",
+    "丙午": "天河水", "丁未": "天河水",
+    "戊申": "大驿土", "己酉": "大驿土",
+    "庚戌": "钗环金", "辛亥": "钗环金",
+    "壬子": "桑柘木", "癸丑": "桑柘木",
+    "甲寅": "大溪水", "乙卯": "大溪水",
+    "丙辰": "沙中土", "丁巳": "沙中土",
+    "戊午": "天上火", "己未": "天上火",
+    "庚申": "石榴木", "辛酉": "石榴木",
+    "壬戌": "大海水", "癸亥": "大海水"
+}
+
+# ---- 整数下标表 ----
+
+# 天干五行：甲乙木(0) 丙丁火(1) 戊己土(2) 庚辛金(3) 壬癸水(4)
+STEM_ELEMENT = tuple(WUXING.index(TIANGAN_WUXING[gan]) for gan in TIANGAN)
+
+# 地支藏干（主气、中气、余气）的天干下标
+BRANCH_HIDDEN_STEMS = tuple(
+    tuple(TIANGAN.index(gan) for gan in DIZHI_CANGGAN[zhi]) for zhi in DIZHI
+)
+
+
+def _shishen_index(day_stem, other_stem):
+    """按五行生克与阴阳推出十神在SHISHEN中的下标"""
+    # 五行差值：0同我(比劫) 1我生(食伤) 2我克(财) 3克我(官杀) 4生我(印)
+    relation = (STEM_ELEMENT[other_stem] - STEM_ELEMENT[day_stem]) % 5
+    same_polarity = day_stem % 2 == other_stem % 2
+    return relation * 2 + (0 if same_polarity else 1)
+
+
+# 十神表：SHISHEN_TABLE[日干][他干] 为SHISHEN中的下标
+SHISHEN_TABLE = tuple(
+    tuple(_shishen_index(day_stem, other_stem) for other_stem in range(10))
+    for day_stem in range(10)
+)
+
+# 十神名称表：GAN_SHEN_TABLE[日干][他干]
+GAN_SHEN_TABLE = tuple(tuple(SHISHEN[i] for i in row) for row in SHISHEN_TABLE)
+
+# 地支十神表：ZHI_SHEN_TABLE[日干][地支] 为该地支各藏干（主气、中气、余气）的十神
+ZHI_SHEN_TABLE = tuple(
+    tuple(tuple(row[stem] for stem in BRANCH_HIDDEN_STEMS[branch]) for branch in range(12))
+    for row in GAN_SHEN_TABLE
+)
+
+# 汉字到下标
+TIANGAN_INDEX = {gan: i for i, gan in enumerate(TIANGAN)}
+DIZHI_INDEX = {zhi: i for i, zhi in enumerate(DIZHI)}
+
+# 纳音表：NAYIN_TABLE[干支序号] 为纳音名称
+NAYIN_TABLE = tuple(NAYIN[TIANGAN[i % 10] + DIZHI[i % 12]] for i in range(60))
+
+
+def pillar_index(stem, branch):
+    """天干、地支下标转换为六十甲子序号"""
+    return (6 * stem - 5 * branch) % 60
+
+
+class Pillar:
+    """一柱干支，index为六十甲子序号
+
+    只依赖本柱干支的输出字段（干支名、天干五行、藏干、纳音）在构造时一次算好，
+    六十个实例在导入时建成，计算命盘时直接引用。
+    """
+
+    __slots__ = ('index', 'stem', 'branch', 'name', 'gan', 'zhi', 'gan_wuxing', 'cang_gan', 'na_yin')
+
+    def __init__(self, index):
+        self.index = index
+        self.stem = index % 10
+        self.branch = index % 12
+        self.gan = TIANGAN[self.stem]
+        self.zhi = DIZHI[self.branch]
+        self.name = self.gan + self.zhi
+        # 如"甲木"
+        self.gan_wuxing = self.gan + WUXING[STEM_ELEMENT[self.stem]]
+        # 如("戊土", "辛金", "丁火")
+        self.cang_gan = tuple(TIANGAN[stem] + WUXING[STEM_ELEMENT[stem]] for stem in BRANCH_HIDDEN_STEMS[self.branch])
+        self.na_yin = NAYIN_TABLE[index]
+
+    def __repr__(self):
+        return f'Pillar({self.index}, {self.name})'
+
+
+# 六十个干支各自唯一的Pillar实例
+PILLARS = tuple(Pillar(i) for i in range(60))
+
+# 依赖日干的字段：RELATIVE_TABLE[日干][干支序号] = (天干十神, 藏干十神元组)
+PillarRelation = namedtuple('PillarRelation', ['gan_shen', 'zhi_shen'])
+RELATIVE_TABLE = tuple(
+    tuple(PillarRelation(GAN_SHEN_TABLE[day_stem][i % 10], ZHI_SHEN_TABLE[day_stem][i % 12]) for i in range(60))
+    for day_stem in range(10)
+)
+
+
+def _by_pillar(values):
+    year, month, day, hour = values
+    return {"year": year, "month": month, "day": day, "hour": hour}
+
+
+def _gan_shen(chart):
+    gan_shen = _by_pillar([rel.gan_shen for rel in chart.relations_to_day])
+    gan_shen["day"] = "日主"
+    return gan_shen
+
+
+def _shen_sha(chart):
+    # shensha模块依赖本模块，延迟导入
+    from shensha import get_chart_shen_sha
+    return get_chart_shen_sha(chart)
+
+
+def _interactions(chart):
+    # interactions模块依赖本模块，延迟导入
+    from interactions import get_chart_interactions
+    return get_chart_interactions(chart)
+
+
+def _wu_xing_strength(chart):
+    # wuxing_strength模块依赖本模块，延迟导入
+    from wuxing_strength import get_chart_wu_xing_strength
+    return get_chart_wu_xing_strength(chart)
+
+
+def _relations(chart):
+    # 天干地支相生相克关系（使用五行属性）
+    return {
+        "tianGan": "→".join(pillar.gan_wuxing for pillar in chart.pillars),
+        "diZhi": "→".join(pillar.zhi for pillar in chart.pillars)
+    }
+
+
+def _lunar_date(chart):
+    record = chart.record
+    return {
+        "year": record.lunar_year,
+        "month": record.lunar_month,
+        "day": record.lunar_day,
+        "leap": record.lunar_leap
+    }
+
+
+def _true_solar_time(chart):
+    true_dt = chart.true_dt
+    return f"{true_dt.year}-{true_dt.month:02d}-{true_dt.day:02d} {true_dt.hour:02d}:{true_dt.minute:02d}"
+
+
+# 输出字段及其生成函数（按输出顺序），只有被访问或请求的字段才会计算
+CHART_SECTIONS = {
+    "年柱": lambda chart: chart.year.name,
+    "月柱": lambda chart: chart.month.name,
+    "日柱": lambda chart: chart.day.name,
+    "时柱": lambda chart: chart.hour.name,
+    "ganShen": _gan_shen,
+    "tianGan": lambda chart: _by_pillar([pillar.gan for pillar in chart.pillars]),
+    "diZhi": lambda chart: _by_pillar([pillar.zhi for pillar in chart.pillars]),
+    "cangGan": lambda chart: _by_pillar([list(pillar.cang_gan) for pillar in chart.pillars]),
+    "zhiShen": lambda chart: _by_pillar([list(rel.zhi_shen) for rel in chart.relations_to_day]),
+    "naYin": lambda chart: _by_pillar([pillar.na_yin for pillar in chart.pillars]),
+    "shenSha": _shen_sha,
+    "relations": _relations,
+    "interactions": _interactions,
+    "wuXingStrength": _wu_xing_strength,
+    "lunarDate": _lunar_date,
+    "zodiac": lambda chart: DIZHI[(chart.record.lunar_year - 4) % 12],
+    "真太阳时": _true_solar_time,
+    # 时支按真太阳时的小时整除2取（沿用原有算法）
+    "时支": lambda chart: DIZHI[chart.true_dt.hour // 2],
+}
+
+# 命盘字典的全部字段
+CHART_FIELDS = tuple(CHART_SECTIONS)
+
+# 需在fields中明确请求才输出的字段（不在默认响应中，免得所有调用方多付计算与响应体开销）
+OPTIONAL_FIELDS = ("interactions", "wuXingStrength")
+
+# 未指定fields时输出的字段
+DEFAULT_FIELDS = tuple(field for field in CHART_FIELDS if field not in OPTIONAL_FIELDS)
+
+# 四柱字段，序列化时总是包含
+PILLAR_FIELDS = CHART_FIELDS[:4]
+
+
+def normalize_fields(fields):
+    """校验字段名并按CHART_FIELDS排序去重，未知字段抛出ValueError"""
+    requested = set(fields)
+    unknown = requested.difference(CHART_FIELDS)
+    if unknown:
+        raise ValueError(f'未知字段: {", ".join(sorted(unknown))}')
+    return tuple(field for field in CHART_FIELDS if field in requested)
+
+
+class Chart:
+    """四柱命盘
+
+    四柱在构造时确定；其余字段（十神、藏干、纳音、神煞、农历日期等）在首次访问时
+    计算并缓存。农历日期所需的日记录可由record_loader按需加载。
+    """
+
+    __slots__ = ('year', 'month', 'day', 'hour', 'true_dt', '_record', '_record_loader', '_sections')
+
+    def __init__(self, year, month, day, hour, record, true_dt, record_loader=None):
+        self.year = year
+        self.month = month
+        self.day = day
+        self.hour = hour
+        self.true_dt = true_dt
+        self._record = record
+        self._record_loader = record_loader
+        self._sections = {}
+
+    @property
+    def pillars(self):
+        return self.year, self.month, self.day, self.hour
+
+    @property
+    def day_stem(self):
+        return self.day.stem
+
+    @property
+    def record(self):
+        """日记录（农历日期等），首次访问时加载"""
+        if self._record is None and self._record_loader is not None:
+            self._record = self._record_loader()
+        return self._record
+
+    @property
+    def relations_to_day(self):
+        """四柱相对日干的(天干十神, 藏干十神)"""
+        relative = RELATIVE_TABLE[self.day.stem]
+        return [relative[pillar.index] for pillar in self.pillars]
+
+    def section(self, field):
+        """按输出字段名取值，首次访问时计算"""
+        try:
+            return self._sections[field]
+        except KeyError:
+            value = self._sections[field] = CHART_SECTIONS[field](self)
+            return value
+
+    gan_shen = property(lambda self: self.section("ganShen"))
+    tian_gan = property(lambda self: self.section("tianGan"))
+    di_zhi = property(lambda self: self.section("diZhi"))
+    cang_gan = property(lambda self: self.section("cangGan"))
+    zhi_shen = property(lambda self: self.section("zhiShen"))
+    na_yin = property(lambda self: self.section("naYin"))
+    shen_sha = property(lambda self: self.section("shenSha"))
+    relations = property(lambda self: self.section("relations"))
+    lunar_date = property(lambda self: self.section("lunarDate"))
+    zodiac = property(lambda self: self.section("zodiac"))
+    true_solar_time = property(lambda self: self.section("真太阳时"))
+    shi_zhi = property(lambda self: self.section("时支"))
+
+    def to_dict(self, fields=None):
+        """序列化为接口返回的字典
+
+        fields为None时输出四柱及已访问过的字段；否则输出fields（须已经过normalize_fields）
+        """
+        if fields is None:
+            fields = [field for field in CHART_FIELDS if field in self._sections or field in PILLAR_FIELDS]
+        sections = self._sections
+        # 已缓存的字段直接取用，其余只计算不缓存
+        return {
+            field: sections[field] if field in sections else CHART_SECTIONS[field](self)
+            for field in fields
+        }
+
+    def __repr__(self):
+        return 'Chart(' + ' '.join(p.name for p in self.pillars) + ')'
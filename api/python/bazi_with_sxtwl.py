@@ -1,118 +1,88 @@
+import argparse
 import datetime
-from typing import Dict, List
+import os
+import random
+import time
+from collections import namedtuple
+from functools import lru_cache, partial
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import sxtwl
 
-# 天干地支名称
-TIANGAN = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
-DIZHI = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
-
-# 五行属性
-WUXING = ["木", "火", "土", "金", "水"]
-
-# 天干五行对应
-TIANGAN_WUXING = {
-    "甲": "木", "乙": "木", 
-    "丙": "火", "丁": "火", 
-    "戊": "土", "己": "土", 
-    "庚": "金", "辛": "金", 
-    "壬": "水", "癸": "水"
-}
-
-# 地支藏干（按照主气、中气、余气排序）
-DIZHI_CANGGAN = {
-    "子": ["癸"],
-    "丑": ["己", "辛", "癸"],
-    "寅": ["甲", "丙", "戊"],
-    "卯": ["乙"],
-    "辰": ["戊", "乙", "癸"],
-    "巳": ["丙", "庚", "戊"],
-    "午": ["丁", "己"],
-    "未": ["己", "丁", "乙"],
-    "申": ["庚", "壬", "戊"],
-    "酉": ["辛"],
-    "戌": ["戊", "辛", "丁"],
-    "亥": ["壬", "甲"]
-}
-
-# 十神名称
-SHISHEN = ["比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印"]
-
-# 纳音五行
-NAYIN = {
-    "甲子": "海中金", "乙丑": "海中金",
-    "丙寅": "炉中火", "丁卯": "炉中火",
-    "戊辰": "大林木", "己巳": "大林木",
-    "庚午": "路旁土", "辛未": "路旁土",
-    "壬申": "剑锋金", "癸酉": "剑锋金",
-    "甲戌": "山头火", "乙亥": "山头火",
-    "丙子": "涧下水", "丁丑": "涧下水",
-    "戊寅": "城头土", "己卯": "城头土",
-    "庚辰": "白蜡金", "辛巳": "白蜡金",
-    "壬午": "杨柳木", "癸未": "杨柳木",
-    "甲申": "泉中水", "乙酉": "泉中水",
-    "丙戌": "屋上土", "丁亥": "屋上土",
-    "戊子": "霹雳火", "己丑": "霹雳火",
-    "庚寅": "松柏木", "辛卯": "松柏木",
-    "壬辰": "长流水", "癸巳": "长流水",
-    "甲午": "沙中金", "乙未": "沙中金",
-    "丙申": "山下火", "丁酉": "山下火",
-    "戊戌": "平地木", "己亥": "平地木",
-    "庚子": "壁上土", "辛丑": "壁上土",
-    "壬寅": "金箔金", "癸卯": "金箔金",
-    "甲辰": "覆灯火", "乙巳": "覆灯火",
-    "丙午": "天河水", "丁未": "天河水",
-    "戊申": "大驿土", "己酉": "大驿土",
-    "庚戌": "钗环金", "辛亥": "钗环金",
-    "壬子": "桑柘木", "癸丑": "桑柘木",
-    "甲寅": "大溪水", "乙卯": "大溪水",
-    "丙辰": "沙中土", "丁巳": "沙中土",
-    "戊午": "天上火", "己未": "天上火",
-    "庚申": "石榴木", "辛酉": "石榴木",
-    "壬戌": "大海水", "癸亥": "大海水"
-}
-
-# 神煞表（简化，仅包含部分常见神煞）
-SHENSHAS = {
-    "贵人": {
-        "甲": ["丑", "未"], "乙": ["子", "申"],
-        "丙": ["亥", "酉"], "丁": ["亥", "酉"],
-        "戊": ["丑", "未"], "己": ["子", "申"],
-        "庚": ["丑", "未"], "辛": ["子", "申"],
-        "壬": ["卯", "巳"], "癸": ["卯", "巳"]
-    },
-    "天乙贵人": {
-        "甲": ["巳", "申"], "乙": ["午", "酉"],
-        "丙": ["申", "亥"], "丁": ["酉", "子"],
-        "戊": ["申", "亥"], "己": ["酉", "子"],
-        "庚": ["亥", "寅"], "辛": ["子", "卯"],
-        "壬": ["寅", "巳"], "癸": ["卯", "午"]
-    },
-    "文昌": {
-        "甲": "巳", "乙": "午", "丙": "申", "丁": "酉",
-        "戊": "申", "己": "酉", "庚": "亥", "辛": "子",
-        "壬": "寅", "癸": "卯"
-    },
-    "华盖": {
-        "子": "未", "丑": "午", "寅": "巳", "卯": "辰",
-        "辰": "卯", "巳": "寅", "午": "丑", "未": "子",
-        "申": "亥", "酉": "戌", "戌": "酉", "亥": "申"
-    },
-    "桃花": {
-        "子": "酉", "丑": "辰", "寅": "亥", "卯": "午",
-        "辰": "丑", "巳": "申", "午": "卯", "未": "戌",
-        "申": "巳", "酉": "子", "戌": "未", "亥": "寅"
-    },
-    "驿马": {
-        "子": "寅", "丑": "亥", "寅": "申", "卯": "巳",
-        "辰": "寅", "巳": "亥", "午": "申", "未": "巳",
-        "申": "寅", "酉": "亥", "戌": "申", "亥": "巳"
-    }
-}
+from jieqi import get_jie_table, to_minutes
+from solar_time import to_beijing, true_solar_time
+
+from bazi_core import (
+    DIZHI, DIZHI_CANGGAN, NAYIN, SHISHEN, TIANGAN, TIANGAN_WUXING, WUXING,
+    DIZHI_INDEX, GAN_SHEN_TABLE, PILLARS, TIANGAN_INDEX, CHART_FIELDS, CHART_SECTIONS, DEFAULT_FIELDS, Chart,
+    normalize_fields, pillar_index
+)
+
+from shensha import SHENSHAS, shen_sha_for_pillars
+
+# 按公历日缓存的sxtwl结果，干支均为六十甲子序号（0-59），年柱、月柱为sxtwl按日计算的值
+DayRecord = namedtuple('DayRecord', [
+    'year_gz', 'month_gz', 'day_gz',
+    'lunar_year', 'lunar_month', 'lunar_day', 'lunar_leap'
+])
+
+# 日缓存容量（天数），默认约覆盖100年
+DAY_CACHE_SIZE = int(os.environ.get('BAZI_DAY_CACHE_SIZE', 36600))
+
+def get_gz_index(gz):
+    """sxtwl干支对象转换为六十甲子序号"""
+    return (6 * gz.tg - 5 * gz.dz) % 60
+
+@lru_cache(maxsize=DAY_CACHE_SIZE)
+def get_day_record(year, month, day):
+    """查询某公历日的干支与农历日期，结果按日缓存"""
+    sx_day = sxtwl.fromSolar(year, month, day)
+    return DayRecord(
+        year_gz=get_gz_index(sx_day.getYearGZ()),
+        month_gz=get_gz_index(sx_day.getMonthGZ()),
+        day_gz=get_gz_index(sx_day.getDayGZ()),
+        lunar_year=sx_day.getLunarYear(),
+        lunar_month=sx_day.getLunarMonth(),
+        lunar_day=sx_day.getLunarDay(),
+        lunar_leap=sx_day.isLunarLeap()
+    )
+
+def prewarm_day_cache(start_year, end_year):
+    """预先缓存[start_year, end_year]内每一天的记录"""
+    date = datetime.date(start_year, 1, 1)
+    end = datetime.date(end_year, 12, 31)
+    while date <= end:
+        get_day_record(date.year, date.month, date.day)
+        date += datetime.timedelta(days=1)
+
+def prewarm_day_cache_from_env():
+    """按环境变量BAZI_PREWARM_YEARS（如"1960-2010"）预热日缓存"""
+    span = os.environ.get('BAZI_PREWARM_YEARS')
+    if span:
+        start_year, end_year = (int(year) for year in span.split('-'))
+        prewarm_day_cache(start_year, end_year)
+
+def get_hour_gz_index(day_gz, hour):
+    """由日柱序号与小时推出时柱序号，23点起用次日日干（与sxtwl的getHourGZ一致）"""
+    hour_index = (hour + 1) // 2
+    stem = (day_gz % 10 * 2 + hour_index) % 10
+    branch = hour_index % 12
+    return (6 * stem - 5 * branch) % 60
 
 def get_ganzhi_str(gz):
     """将干支对象转换为字符串"""
     return TIANGAN[gz.tg] + DIZHI[gz.dz]
 
+def ganzhi_by_index(index):
+    """六十甲子序号（0-59）转换为字符串"""
+    return TIANGAN[index % 10] + DIZHI[index % 12]
+
+def get_year_month_gz(dt, record):
+    """按节气表确定年柱、月柱序号，精确到交节的分钟；超出节气表范围时退回sxtwl按日计算的值"""
+    indices = get_jie_table().pillar_indices(to_minutes(dt))
+    if indices is None:
+        return record.year_gz, record.month_gz
+    return indices
+
 def get_shichen(hour):
     """根据小时确定时辰"""
     return DIZHI[hour // 2]
@@ -131,231 +101,191 @@ def get_cang_gan_with_wuxing(dizhi):
     return [f"{gan}{TIANGAN_WUXING[gan]}" for gan in cang_gans]
 
 def get_gan_shen(day_gan, other_gan):
-    """计算天干十神"""
-    # 以日干为主，计算其它天干的十神关系
-    
-    # 十神索引表 - 标准命理学顺序
-    # 固定十神排列: 比肩、劫财、食神、伤官、偏财、正财、七杀、正官、偏印、正印
-    SHISHEN_MAP = {
-        # 甲见甲到癸
-        "甲": ["比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印"],
-        # 乙见甲到癸
-        "乙": ["劫财", "比肩", "伤官", "食神", "正财", "偏财", "正官", "七杀", "正印", "偏印"],
-        # 丙见甲到癸
-        "丙": ["偏印", "正印", "比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官"],
-        # 丁见甲到癸
-        "丁": ["正印", "偏印", "劫财", "比肩", "伤官", "食神", "正财", "偏财", "正官", "七杀"],
-        # 戊见甲到癸
-        "戊": ["七杀", "正官", "偏印", "正印", "比肩", "劫财", "食神", "伤官", "偏财", "正财"],
-        # 己见甲到癸
-        "己": ["正官", "七杀", "正印", "偏印", "劫财", "比肩", "伤官", "食神", "正财", "偏财"],
-        # 庚见甲到癸
-        "庚": ["偏财", "正财", "七杀", "正官", "偏印", "正印", "比肩", "劫财", "食神", "伤官"],
-        # 辛见甲到癸
-        "辛": ["正财", "偏财", "正官", "七杀", "正印", "偏印", "劫财", "比肩", "伤官", "食神"],
-        # 壬见甲到癸
-        "壬": ["食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印", "比肩", "劫财"],
-        # 癸见甲到癸
-        "癸": ["伤官", "食神", "正财", "偏财", "正官", "七杀", "正印", "偏印", "劫财", "比肩"],
-    }
-    
-    other_index = TIANGAN.index(other_gan)
-    return SHISHEN_MAP[day_gan][other_index]
+    """计算天干十神（查预计算的十神表）"""
+    return GAN_SHEN_TABLE[TIANGAN_INDEX[day_gan]][TIANGAN_INDEX[other_gan]]
 
 def get_zhi_shen(day_gan, cang_gans):
     """计算地支十神"""
     if not cang_gans:
         return ["无"] 
-    return [get_gan_shen(day_gan, cg) for cg in cang_gans]
+    row = GAN_SHEN_TABLE[TIANGAN_INDEX[day_gan]]
+    return [row[TIANGAN_INDEX[cg]] for cg in cang_gans]
 
 def get_shen_sha(year_gz, month_gz, day_gz, hour_gz):
     """获取四柱神煞（简化版）"""
-    result = {"year": [], "month": [], "day": [], "hour": []}
-    
-    # 提取天干地支
-    year_gan, year_zhi = year_gz[0], year_gz[1]
-    month_gan, month_zhi = month_gz[0], month_gz[1]
-    day_gan, day_zhi = day_gz[0], day_gz[1]
-    hour_gan, hour_zhi = hour_gz[0], hour_gz[1]
-    
-    # 检查贵人
-    if "贵人" in SHENSHAS and year_zhi in SHENSHAS["贵人"].get(day_gan, []):
-        result["year"].append("贵人")
-    if "贵人" in SHENSHAS and month_zhi in SHENSHAS["贵人"].get(day_gan, []):
-        result["month"].append("贵人")
-    if "贵人" in SHENSHAS and hour_zhi in SHENSHAS["贵人"].get(day_gan, []):
-        result["hour"].append("贵人")
-    
-    # 检查天乙贵人
-    if "天乙贵人" in SHENSHAS and year_zhi in SHENSHAS["天乙贵人"].get(day_gan, []):
-        result["year"].append("天乙贵人")
-    if "天乙贵人" in SHENSHAS and month_zhi in SHENSHAS["天乙贵人"].get(day_gan, []):
-        result["month"].append("天乙贵人")
-    if "天乙贵人" in SHENSHAS and hour_zhi in SHENSHAS["天乙贵人"].get(day_gan, []):
-        result["hour"].append("天乙贵人")
-    
-    # 检查文昌
-    if "文昌" in SHENSHAS and year_zhi == SHENSHAS["文昌"].get(day_gan, ""):
-        result["year"].append("文昌")
-    if "文昌" in SHENSHAS and month_zhi == SHENSHAS["文昌"].get(day_gan, ""):
-        result["month"].append("文昌")
-    if "文昌" in SHENSHAS and hour_zhi == SHENSHAS["文昌"].get(day_gan, ""):
-        result["hour"].append("文昌")
-    
-    # 检查华盖
-    if "华盖" in SHENSHAS and year_zhi == SHENSHAS["华盖"].get(year_zhi, ""):
-        result["year"].append("华盖")
-    if "华盖" in SHENSHAS and month_zhi == SHENSHAS["华盖"].get(month_zhi, ""):
-        result["month"].append("华盖")
-    if "华盖" in SHENSHAS and day_zhi == SHENSHAS["华盖"].get(day_zhi, ""):
-        result["day"].append("华盖")
-    if "华盖" in SHENSHAS and hour_zhi == SHENSHAS["华盖"].get(hour_zhi, ""):
-        result["hour"].append("华盖")
-    
-    # 检查桃花
-    if "桃花" in SHENSHAS and year_zhi == SHENSHAS["桃花"].get(year_zhi, ""):
-        result["year"].append("桃花")
-    if "桃花" in SHENSHAS and month_zhi == SHENSHAS["桃花"].get(month_zhi, ""):
-        result["month"].append("桃花")
-    if "桃花" in SHENSHAS and day_zhi == SHENSHAS["桃花"].get(day_zhi, ""):
-        result["day"].append("桃花")
-    if "桃花" in SHENSHAS and hour_zhi == SHENSHAS["桃花"].get(hour_zhi, ""):
-        result["hour"].append("桃花")
-    
-    # 检查驿马
-    if "驿马" in SHENSHAS and year_zhi == SHENSHAS["驿马"].get(year_zhi, ""):
-        result["year"].append("驿马")
-    if "驿马" in SHENSHAS and month_zhi == SHENSHAS["驿马"].get(month_zhi, ""):
-        result["month"].append("驿马")
-    if "驿马" in SHENSHAS and day_zhi == SHENSHAS["驿马"].get(day_zhi, ""):
-        result["day"].append("驿马")
-    if "驿马" in SHENSHAS and hour_zhi == SHENSHAS["驿马"].get(hour_zhi, ""):
-        result["hour"].append("驿马")
-    
-    return result
+    return shen_sha_for_pillars(*(PILLARS[pillar_index(TIANGAN_INDEX[gz[0]], DIZHI_INDEX[gz[1]])]
+                                  for gz in (year_gz, month_gz, day_gz, hour_gz)))
 
-def calculate_bazi(dt: datetime.datetime, longitude: float) -> Dict[str, str]:
-    """使用sxtwl库计算八字"""
-    
-    # 真太阳时校正（简化版本）
+def get_true_solar_time(dt, longitude):
+    """真太阳时校正（简化版本）"""
     local_minutes = longitude * 4
     delta = datetime.timedelta(minutes=local_minutes - 120 * 4)  # 北京时间校正
-    true_dt = dt + delta
-    
-    # 获取基本信息
-    day = sxtwl.fromSolar(dt.year, dt.month, dt.day)
-    
-    # 计算年柱
-    year_gz = day.getYearGZ()
-    year_str = get_ganzhi_str(year_gz)
-    
-    # 计算月柱
-    month_gz = day.getMonthGZ()
-    month_str = get_ganzhi_str(month_gz)
-    
-    # 计算日柱
-    day_gz = day.getDayGZ()
-    day_str = get_ganzhi_str(day_gz)
-    
-    # 计算时柱
-    hour_gz = day.getHourGZ(true_dt.hour)
-    hour_str = get_ganzhi_str(hour_gz)
-    
-    # 时支
-    shichen = get_shichen(true_dt.hour)
-    
-    # 提取天干地支
-    year_gan, year_zhi = year_str[0], year_str[1]
-    month_gan, month_zhi = month_str[0], month_str[1]
-    day_gan, day_zhi = day_str[0], day_str[1]
-    hour_gan, hour_zhi = hour_str[0], hour_str[1]
+    return dt + delta
+
+# EPOCH_DAY（1900-01-01）为甲戌日，六十甲子序号10
+_EPOCH_ORDINAL = datetime.date(1900, 1, 1).toordinal()
+_EPOCH_DAY_GZ = 10
+
+def get_day_gz_index(date):
+    """公历日的日柱序号，按距1900-01-01的天数推算（与sxtwl的getDayGZ一致）"""
+    return (date.toordinal() - _EPOCH_ORDINAL + _EPOCH_DAY_GZ) % 60
+
+# 子时规则（见resolve_pillars）
+ZI_HOUR_CONVENTIONS = ('civil', 'split', 'rollover')
+
+def normalize_zi_hour(zi_hour=None):
+    """校验子时规则，None取默认值，未知规则抛出ValueError"""
+    if zi_hour is None:
+        return DEFAULT_ZI_HOUR
+    if zi_hour not in ZI_HOUR_CONVENTIONS:
+        raise ValueError(f'未知的子时规则: {zi_hour}，可选: {", ".join(ZI_HOUR_CONVENTIONS)}')
+    return zi_hour
+
+# 默认子时规则，可用BAZI_ZI_HOUR修改
+DEFAULT_ZI_HOUR = normalize_zi_hour(os.environ.get('BAZI_ZI_HOUR', 'civil'))
+
+# 修改四柱的确定方式（resolve_pillars、build_chart）后须增加disk_cache.ENGINE_REVISION，
+# 否则磁盘缓存会继续返回按旧算法算出的命盘
+def resolve_pillars(beijing_dt, true_dt, civil_date, zi_hour='civil'):
+    """按分钟确定四柱序号，返回(年柱, 月柱, 日柱, 时柱, 日柱对应的公历日)
     
-    # 计算干神
-    gan_shen = {
-        "year": get_gan_shen(day_gan, year_gan),
-        "month": get_gan_shen(day_gan, month_gan),
-        "day": "日主",
-        "hour": get_gan_shen(day_gan, hour_gan)
-    }
+    年柱、月柱以北京时间与节气表中的交节时刻比较（超出表范围时为None）；
+    时柱取真太阳时的时辰，日柱按子时规则：
     
-    # 提取天干
-    tian_gan = {
-        "year": year_gan,
-        "month": month_gan,
-        "day": day_gan,
-        "hour": hour_gan
-    }
+        civil     日柱取输入的公历日（原有算法，与sxtwl按日查询一致）
+        split     日柱取真太阳时所在日，23点后为晚子时：日柱不变，时干取次日（早晚子时）
+        rollover  日柱取真太阳时所在日，23点起即换为次日（子时换日）
     
-    # 提取地支
-    di_zhi = {
-        "year": year_zhi,
-        "month": month_zhi,
-        "day": day_zhi,
-        "hour": hour_zhi
-    }
+    三种规则的时柱相同，只查节气表与做整数运算，不调用sxtwl
+    """
+    indices = get_jie_table().pillar_indices(to_minutes(beijing_dt)) or (None, None)
+    date = civil_date if zi_hour == 'civil' else true_dt.date()
+    day_gz = get_day_gz_index(date)
+    hour_gz = get_hour_gz_index(day_gz, true_dt.hour)
+    if zi_hour == 'rollover' and true_dt.hour == 23:
+        date += datetime.timedelta(days=1)
+        day_gz = (day_gz + 1) % 60
+    return indices[0], indices[1], day_gz, hour_gz, date
+
+def resolve_times(dt, longitude, timezone=None):
+    """返回(北京时间, 真太阳时, 当地钟表时间)，均不带tzinfo，参数含义同build_chart"""
+    if timezone is None and dt.tzinfo is None:
+        return dt, get_true_solar_time(dt, longitude), dt
+    return to_beijing(dt, timezone), true_solar_time(dt, timezone, longitude), dt.replace(tzinfo=None)
+
+def build_chart(dt: datetime.datetime, longitude: float, timezone: Optional[str] = None,
+                zi_hour: Optional[str] = None) -> Chart:
+    """计算四柱，返回Chart
     
-    # 计算藏干
-    cang_gan = {
-        "year": get_cang_gan_with_wuxing(year_zhi),
-        "month": get_cang_gan_with_wuxing(month_zhi),
-        "day": get_cang_gan_with_wuxing(day_zhi),
-        "hour": get_cang_gan_with_wuxing(hour_zhi)
-    }
+    timezone为IANA时区名时，dt按该时区的钟表时间解释（dt带tzinfo时以其为准），
+    真太阳时计入历史夏令时与均时差（见solar_time）；两者都未给出时沿用原有算法：
+    dt视为北京时间，真太阳时只按经度校正。zi_hour为子时规则（见resolve_pillars），
+    默认DEFAULT_ZI_HOUR。
     
-    # 计算支神
-    zhi_shen = {
-        "year": get_zhi_shen(day_gan, get_cang_gan(year_zhi)),
-        "month": get_zhi_shen(day_gan, get_cang_gan(month_zhi)),
-        "day": get_zhi_shen(day_gan, get_cang_gan(day_zhi)),
-        "hour": get_zhi_shen(day_gan, get_cang_gan(hour_zhi))
-    }
+    四柱只需查节气表与做整数运算；农历日期需要sxtwl，在首次访问chart.record时才查询
+    （节气表范围外须由sxtwl求年柱、月柱，此时立即查询）
+    """
+    beijing_dt, true_dt, dt = resolve_times(dt, longitude, timezone)
     
-    # 计算纳音
-    na_yin = {
-        "year": get_nayin(year_str),
-        "month": get_nayin(month_str),
-        "day": get_nayin(day_str),
-        "hour": get_nayin(hour_str)
-    }
+    # 年柱、月柱、日柱、时柱
+    year_gz, month_gz, day_gz, hour_gz, date = resolve_pillars(
+        beijing_dt, true_dt, dt, normalize_zi_hour(zi_hour))
+    record = None
+    if year_gz is None:
+        record = get_day_record(date.year, date.month, date.day)
+        year_gz, month_gz = record.year_gz, record.month_gz
     
-    # 计算神煞
-    shen_sha = get_shen_sha(year_str, month_str, day_str, hour_str)
+    return Chart(PILLARS[year_gz], PILLARS[month_gz], PILLARS[day_gz], PILLARS[hour_gz], record, true_dt,
+                 partial(get_day_record, date.year, date.month, date.day))
+
+def calculate_bazi(dt: datetime.datetime, longitude: float, fields: Optional[Sequence[str]] = None,
+                   timezone: Optional[str] = None, zi_hour: Optional[str] = None) -> Dict[str, str]:
+    """使用sxtwl库计算八字，fields为要返回的字段（见CHART_FIELDS），默认为DEFAULT_FIELDS
     
-    # 五行属性
-    year_gan_wuxing = TIANGAN_WUXING.get(year_gan, "")
-    month_gan_wuxing = TIANGAN_WUXING.get(month_gan, "")
-    day_gan_wuxing = TIANGAN_WUXING.get(day_gan, "")
-    hour_gan_wuxing = TIANGAN_WUXING.get(hour_gan, "")
-
-    # 天干地支相生相克关系（使用五行属性）
-    relations = {
-        "tianGan": f"{year_gan}{year_gan_wuxing}→{month_gan}{month_gan_wuxing}→{day_gan}{day_gan_wuxing}→{hour_gan}{hour_gan_wuxing}",
-        "diZhi": f"{year_zhi}→{month_zhi}→{day_zhi}→{hour_zhi}"
-    }
+    需要按页面读取不同字段时，可直接使用build_chart返回的Chart，字段在访问时才计算
+    """
+    fields = DEFAULT_FIELDS if fields is None else normalize_fields(fields)
+    return build_chart(dt, longitude, timezone, zi_hour).to_dict(fields)
+
+def calculate_bazi_many(records: Iterable[Tuple[datetime.datetime, float]],
+                        fields: Optional[Sequence[str]] = None) -> List[Dict[str, str]]:
+    """批量计算八字，按输入顺序返回结果，记录为(出生时间, 经度[, 时区[, 子时规则]])
     
-    # 返回完整结果
-    result = {
-        "年柱": year_str,
-        "月柱": month_str,
-        "日柱": day_str,
-        "时柱": hour_str,
-        "ganShen": gan_shen,
-        "tianGan": tian_gan,
-        "diZhi": di_zhi,
-        "cangGan": cang_gan,
-        "zhiShen": zhi_shen,
-        "naYin": na_yin,
-        "shenSha": shen_sha,
-        "relations": relations,
-        "lunarDate": {
-            "year": day.getLunarYear(),
-            "month": day.getLunarMonth(),
-            "day": day.getLunarDay(),
-            "leap": day.isLunarLeap()
-        },
-        "zodiac": DIZHI[(day.getLunarYear() - 4) % 12],
-        "真太阳时": true_dt.strftime("%Y-%m-%d %H:%M"),
-        "时支": shichen
+    同一公历日的sxtwl结果经日缓存共用，十神、纳音、藏干均为模块级预计算表
+    """
+    fields = DEFAULT_FIELDS if fields is None else normalize_fields(fields)
+    return [build_chart(*record).to_dict(fields) for record in records]
+
+def chart_to_dict(chart: Chart, fields: Sequence[str] = DEFAULT_FIELDS) -> Dict[str, str]:
+    """将Chart序列化为接口返回的字典，fields须已经过normalize_fields"""
+    return chart.to_dict(fields)
+
+def _legacy_gan_shen(day_gan, other_gan):
+    """原有的天干十神实现（每次调用重建十神字典），只用于bench对比"""
+    SHISHEN_MAP = {
+        "甲": ["比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印"],
+        "乙": ["劫财", "比肩", "伤官", "食神", "正财", "偏财", "正官", "七杀", "正印", "偏印"],
+        "丙": ["偏印", "正印", "比肩", "劫财", "食神", "伤官", "偏财", "正财", "七杀", "正官"],
+        "丁": ["正印", "偏印", "劫财", "比肩", "伤官", "食神", "正财", "偏财", "正官", "七杀"],
+        "戊": ["七杀", "正官", "偏印", "正印", "比肩", "劫财", "食神", "伤官", "偏财", "正财"],
+        "己": ["正官", "七杀", "正印", "偏印", "劫财", "比肩", "伤官", "食神", "正财", "偏财"],
+        "庚": ["偏财", "正财", "七杀", "正官", "偏印", "正印", "比肩", "劫财", "食神", "伤官"],
+        "辛": ["正财", "偏财", "正官", "七杀", "正印", "偏印", "劫财", "比肩", "伤官", "食神"],
+        "壬": ["食神", "伤官", "偏财", "正财", "七杀", "正官", "偏印", "正印", "比肩", "劫财"],
+        "癸": ["伤官", "食神", "正财", "偏财", "正官", "七杀", "正印", "偏印", "劫财", "比肩"],
     }
-    
-    return result
+    return SHISHEN_MAP[day_gan][TIANGAN.index(other_gan)]
+
+def _legacy_zhi_shen(day_gan, cang_gans):
+    return [_legacy_gan_shen(day_gan, cg) for cg in cang_gans]
+
+def bench(count, seed=0):
+    """比较原有实现与十神表：核对全部日干、他干组合后，输出单次调用、每张命盘十神部分与calculate_bazi的耗时"""
+    for day_gan in TIANGAN:
+        for other_gan in TIANGAN:
+            if _legacy_gan_shen(day_gan, other_gan) != get_gan_shen(day_gan, other_gan):
+                raise AssertionError(f'十神表与原有实现不一致: {day_gan}见{other_gan}')
+
+    rng = random.Random(seed)
+    records = [(datetime.datetime(rng.randint(1900, 2100), rng.randint(1, 12), rng.randint(1, 28),
+                                  rng.randint(0, 23), rng.randint(0, 59)), rng.uniform(73, 135))
+               for _ in range(count)]
+    charts = [build_chart(*record) for record in records]
+    # 先加载全部日记录，calculate_bazi只比较排盘本身
+    for chart in charts:
+        chart.record
+    pairs = [(TIANGAN[rng.randrange(10)], TIANGAN[rng.randrange(10)]) for _ in range(count)]
+    # 原有实现以汉字为参数：日干、年月时干与四柱的藏干
+    legacy_inputs = [
+        (TIANGAN[chart.day.stem], [TIANGAN[pillar.stem] for pillar in (chart.year, chart.month, chart.hour)],
+         [get_cang_gan(DIZHI[pillar.branch]) for pillar in (chart.year, chart.month, chart.day, chart.hour)])
+        for chart in charts
+    ]
+
+    def legacy_chart(day_gan, stems, cang_gans):
+        return [_legacy_gan_shen(day_gan, stem) for stem in stems], [_legacy_zhi_shen(day_gan, cg) for cg in cang_gans]
+
+    timings = [
+        ('get_gan_shen 原有实现', '次', lambda: [_legacy_gan_shen(*pair) for pair in pairs]),
+        ('get_gan_shen 十神表', '次', lambda: [get_gan_shen(*pair) for pair in pairs]),
+        ('ganShen+zhiShen 原有实现', '盘', lambda: [legacy_chart(*inputs) for inputs in legacy_inputs]),
+        ('ganShen+zhiShen 十神表', '盘', lambda: [chart.to_dict(("ganShen", "zhiShen")) for chart in charts]),
+        ('calculate_bazi', '盘', lambda: [calculate_bazi(*record) for record in records]),
+    ]
+    for name, unit, run in timings:
+        best = float('inf')
+        for _ in range(5):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        print(f'{name:<24} {best / count * 1e6:7.2f} 微秒/{unit}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='十神表的耗时测试')
+    parser.add_argument('--bench', type=int, metavar='COUNT', default=20000, help='命盘数量')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    bench(args.bench, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""批量八字计算命令行工具
+
+从文件或stdin逐行读取出生记录（NDJSON或带表头的CSV，字段同userData），
+计算后逐行向stdout输出NDJSON，全程流式处理，内存占用与输入大小无关：
+
+    python bulk_cli.py users.ndjson > charts.ndjson
+    cat users.csv | python bulk_cli.py --format csv --jobs 8 --fields 年柱,月柱,日柱,时柱
+
+每行输出 {"line": 行号, "id": 记录的id（如有）, "chart": {...}}；
+出错的记录按--on-error处理：skip跳过，emit输出 {"line": ..., "error": ...}，
+abort在第一条错误处退出（退出码1）。输出顺序与输入一致。
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from functools import partial
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_with_sxtwl import CHART_FIELDS, calculate_bazi, normalize_fields
+from chart_input import parse_user_data
+from chart_pool import DEFAULT_CHUNKSIZE, ChartPool
+
+ON_ERROR_CHOICES = ('skip', 'emit', 'abort')
+
+
+def read_ndjson(stream):
+    """逐行产出(行号, userData)，无法解析的行产出(行号, 错误信息)"""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, f'JSON格式错误: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line_no, '每行必须是JSON对象'
+            continue
+        yield line_no, row
+
+
+def read_csv(stream):
+    """按表头逐行产出(行号, userData)"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _process_row(row, fields):
+    """计算一条记录，返回输出字典（出错时含error字段）"""
+    line_no, user_data = row
+    if isinstance(user_data, str):
+        return {'line': line_no, 'error': user_data}
+
+    output = {'line': line_no}
+    if user_data.get('id') not in (None, ''):
+        output['id'] = user_data['id']
+    try:
+        birth_time, longitude, timezone, zi_hour = parse_user_data(user_data)
+        output['chart'] = calculate_bazi(birth_time, longitude, fields, timezone, zi_hour)
+    except (ValueError, TypeError, OverflowError) as e:
+        output['error'] = str(e)
+    return output
+
+
+def _process_chunk(fields, rows):
+    """在子进程中处理一个块"""
+    return [_process_row(row, fields) for row in rows]
+
+
+def process(rows, fields=None, jobs=1, chunksize=DEFAULT_CHUNKSIZE):
+    """按输入顺序逐条产出输出字典；jobs大于1时用多进程计算"""
+    if jobs <= 1:
+        for row in rows:
+            yield _process_row(row, fields)
+        return
+
+    with ChartPool(jobs, chunksize, chunk_func=partial(_process_chunk, fields)) as pool:
+        yield from pool.map(rows)
+
+
+def _open_input(path, fmt):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    return open(path, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+
+
+def _detect_format(path, fmt):
+    if fmt != 'auto':
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def _parse_fields(value):
+    try:
+        return normalize_fields(field.strip() for field in value.split(',') if field.strip())
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f'{e}（可选: {",".join(CHART_FIELDS)}）') from None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量计算八字，输入NDJSON/CSV，输出NDJSON')
+    parser.add_argument('input', nargs='?', default='-', help='输入文件，默认或为-时读取stdin')
+    parser.add_argument('--format', choices=('auto', 'ndjson', 'csv'), default='auto',
+                        help='输入格式，auto按扩展名判断（stdin默认为ndjson）')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='计算进程数，默认1（不启用进程池）')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='每个进程任务包含的记录数')
+    parser.add_argument('--fields', type=_parse_fields, default=None, help='只输出的字段，逗号分隔')
+    parser.add_argument('--on-error', choices=ON_ERROR_CHOICES, default='emit', help='出错记录的处理方式')
+    args = parser.parse_args(argv)
+
+    fmt = _detect_format(args.input, args.format)
+    errors = 0
+    with _open_input(args.input, fmt) as stream:
+        rows = read_csv(stream) if fmt == 'csv' else read_ndjson(stream)
+        out = sys.stdout
+        try:
+            for output in process(rows, args.fields, args.jobs, args.chunksize):
+                if 'error' in output:
+                    errors += 1
+                    if args.on_error == 'skip':
+                        continue
+                    if args.on_error == 'abort':
+                        out.flush()
+                        print(f'第{output["line"]}行出错: {output["error"]}', file=sys.stderr)
+                        return 1
+                out.write(json.dumps(output, ensure_ascii=False) + '\n')
+            out.flush()
+        except BrokenPipeError:
+            # 下游（如head）提前关闭管道时静默退出
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            return 0
+
+    if errors:
+        print(f'共{errors}条记录出错', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
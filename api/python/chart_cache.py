@@ -0,0 +1,147 @@
+"""calculate_bazi结果缓存（进程内LRU + TTL）
+
+键为归一化后的(真太阳时分钟数, 按精度取整的经度, 字段列表[, 时区], 子时规则[, 格式])：出生时间截断到分钟，
+经度保留BAZI_CACHE_LON_PRECISION位小数，并以归一化后的输入计算结果，
+因此同一个键永远对应同一个结果。
+
+环境变量：
+    BAZI_CACHE_SIZE           最多缓存的结果数，默认4096，0表示不缓存
+    BAZI_CACHE_TTL            结果有效期（秒），默认3600
+    BAZI_CACHE_LON_PRECISION  经度保留的小数位数，默认4
+
+设置BAZI_DISK_CACHE时，进程内未命中的结果再查磁盘缓存（见disk_cache），计算结果同时写入两者。
+磁盘上只存编码后的命盘（键以格式名结尾），cached_calculate_bazi取JSON格式的条目解码，
+因此与cached_chart_bytes、disk_cache.preload写入的条目共用。
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from bazi_with_sxtwl import DEFAULT_FIELDS, build_chart, get_true_solar_time, normalize_fields, normalize_zi_hour
+from disk_cache import disk_cache
+from jieqi import to_minutes
+from response_formats import JsonFormat
+
+
+class ChartCache:
+    """线程安全的LRU + TTL缓存，记录命中、未命中与淘汰次数"""
+
+    def __init__(self, maxsize=4096, ttl=3600.0, longitude_precision=4, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.longitude_precision = longitude_precision
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def normalize(self, dt, longitude, fields=None, timezone=None, zi_hour=None):
+        """返回(缓存键, 截断到分钟的出生时间, 取整后的经度, 规范化的字段列表)
+
+        指定时区时，同一真太阳时可能对应不同的钟表时间（夏令时、均时差），键改用钟表时间的分钟数；
+        键中总是带有解析后的子时规则（各进程的BAZI_ZI_HOUR可能不同，而磁盘缓存是共享的）
+        """
+        dt = dt.replace(second=0, microsecond=0)
+        longitude = round(float(longitude), self.longitude_precision)
+        if fields is not None:
+            fields = normalize_fields(fields)
+        if timezone is None:
+            key = (to_minutes(get_true_solar_time(dt, longitude)), longitude, fields)
+        else:
+            key = (to_minutes(dt), longitude, fields, timezone)
+        key += ('zi', normalize_zi_hour(zi_hour))
+        return key, dt, longitude, fields
+
+    def get(self, key):
+        """命中时返回缓存值并移到队尾，否则返回None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+chart_cache = ChartCache(
+    maxsize=int(os.environ.get('BAZI_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('BAZI_CACHE_TTL', 3600)),
+    longitude_precision=int(os.environ.get('BAZI_CACHE_LON_PRECISION', 4))
+)
+
+
+def cached_calculate_bazi(dt, longitude, fields=None, cache=chart_cache, timezone=None, zi_hour=None,
+                          disk=disk_cache):
+    """带缓存的calculate_bazi；返回的字典在多次调用间共享，调用方不应修改"""
+    key, dt, longitude, fields = cache.normalize(dt, longitude, fields, timezone, zi_hour)
+    result = cache.get(key)
+    if result is None:
+        disk_key = key + (JsonFormat.name,)
+        encoded = disk.get(disk_key) if disk is not None else None
+        if encoded is not None:
+            # 编码后的命盘带有source，calculate_bazi的结果没有
+            result = json.loads(encoded)
+            result.pop('source', None)
+        else:
+            chart = build_chart(dt, longitude, timezone, zi_hour)
+            result = chart.to_dict(fields or DEFAULT_FIELDS)
+            if disk is not None:
+                disk.put(disk_key, JsonFormat.chart(chart, fields or DEFAULT_FIELDS))
+        cache.put(key, result)
+    return result
+
+
+def cached_chart_bytes(dt, longitude, fields=None, response_format=JsonFormat, cache=chart_cache,
+                       timezone=None, zi_hour=None, disk=disk_cache):
+    """带缓存的已编码命盘（response_format.chart的结果），命中时无需再序列化"""
+    key, dt, longitude, fields = cache.normalize(dt, longitude, fields, timezone, zi_hour)
+    key += (response_format.name,)
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = disk.get(key) if disk is not None else None
+        if encoded is None:
+            encoded = response_format.chart(build_chart(dt, longitude, timezone, zi_hour), fields or DEFAULT_FIELDS)
+            if disk is not None:
+                disk.put(key, encoded)
+        cache.put(key, encoded)
+    return encoded
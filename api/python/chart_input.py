@@ -0,0 +1,93 @@
+import datetime
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from bazi_with_sxtwl import normalize_fields, normalize_zi_hour, resolve_times
+from solar_time import get_zone
+
+# 计算八字所需的用户字段
+REQUIRED_FIELDS = ['birthYear', 'birthMonth', 'birthDay', 'birthHour', 'birthMinute', 'longitude']
+
+
+class ChartInputError(ValueError):
+    """用户输入不完整，批量请求时index为出错记录的下标"""
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def parse_user_data(user_data: Dict[str, Any]) -> Tuple[datetime.datetime, float, Optional[str], Optional[str]]:
+    """校验userData并转换为(出生时间, 经度, 时区, 子时规则)，缺少字段时抛出ChartInputError
+
+    可选的timezone为IANA时区名（如"Asia/Shanghai"），未提供时为None（出生时间按北京时间处理）；
+    可选的ziHour为子时规则（civil、split或rollover，见bazi_with_sxtwl.resolve_pillars），未提供时为None
+    """
+    if not isinstance(user_data, dict):
+        raise ChartInputError('userData必须是对象')
+    for field in REQUIRED_FIELDS:
+        if field not in user_data:
+            raise ChartInputError(f'缺少必要字段: {field}')
+
+    # 非数字或不存在的日期（如2月31日）同样是输入错误，不应作为计算失败返回500
+    try:
+        birth_time = datetime.datetime(
+            year=int(user_data['birthYear']),
+            month=int(user_data['birthMonth']),
+            day=int(user_data['birthDay']),
+            hour=int(user_data['birthHour']),
+            minute=int(user_data['birthMinute'])
+        )
+        longitude = float(user_data['longitude'])
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ChartInputError(f'无效的出生时间或经度: {e}') from None
+    # float()接受"nan"、"inf"与1e300，这些值到计算时才出错
+    if not math.isfinite(longitude) or not -180 <= longitude <= 180:
+        raise ChartInputError(f'经度须在-180到180之间: {user_data["longitude"]}')
+    timezone = user_data.get('timezone') or None
+    if timezone is not None:
+        try:
+            get_zone(str(timezone))
+        except ValueError as e:
+            raise ChartInputError(str(e)) from None
+        timezone = str(timezone)
+    zi_hour = user_data.get('ziHour') or None
+    if zi_hour is not None:
+        try:
+            zi_hour = normalize_zi_hour(str(zi_hour))
+        except ValueError as e:
+            raise ChartInputError(str(e)) from None
+    # 接近datetime上下限的出生时间（如公元1年1月1日）在换算真太阳时的时候会溢出
+    try:
+        resolve_times(birth_time, longitude, timezone)
+    except OverflowError:
+        raise ChartInputError('出生时间超出可计算的范围') from None
+    return birth_time, longitude, timezone, zi_hour
+
+
+def parse_fields(fields: Any) -> Optional[Tuple[str, ...]]:
+    """校验fields选项：数组或逗号分隔的字符串，未提供时返回None（全部字段）"""
+    if fields is None or fields == '':
+        return None
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        raise ChartInputError('fields必须是字段名数组或逗号分隔的字符串')
+    try:
+        return normalize_fields(fields)
+    except ValueError as e:
+        raise ChartInputError(str(e)) from None
+
+
+def parse_user_data_list(user_data_list: Any) -> List[Tuple[datetime.datetime, float, Optional[str], Optional[str]]]:
+    """校验批量请求的userDataList"""
+    if not isinstance(user_data_list, list):
+        raise ChartInputError('userDataList必须是数组')
+
+    records = []
+    for index, user_data in enumerate(user_data_list):
+        try:
+            records.append(parse_user_data(user_data))
+        except ChartInputError as e:
+            raise ChartInputError(str(e), index) from None
+    return records
@@ -0,0 +1,167 @@
+"""多进程批量八字计算
+
+calculate_bazi是占用GIL的纯Python计算，线程无法并行。ChartPool把记录按块
+分发给进程池，每个子进程启动时加载节气表并可预热日缓存，之后只接收计算任务：
+
+    with ChartPool(workers=8) as pool:
+        for chart in pool.map(records):               # 按输入顺序
+            ...
+        for index, chart in pool.map(records, ordered=False):  # 谁先算完先返回
+            ...
+
+records可以是任意可迭代对象（如逐行读取的文件），任一时刻最多只有
+workers * max_pending_chunks 个块在途，内存占用与输入总量无关。
+
+基准测试（对比1..N个进程的吞吐量）：
+
+    python chart_pool.py --bench --count 200000
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_with_sxtwl import calculate_bazi_many, prewarm_day_cache
+from jieqi import get_jie_table
+
+DEFAULT_CHUNKSIZE = 256
+
+
+def _init_worker(prewarm_years):
+    """子进程初始化：加载节气表，按需预热日缓存"""
+    get_jie_table()
+    if prewarm_years:
+        prewarm_day_cache(*prewarm_years)
+
+
+def _compute_chunk(chunk):
+    return calculate_bazi_many(chunk)
+
+
+def _chunks(records, chunksize):
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ChartPool:
+    """计算八字的进程池，workers默认为CPU核数"""
+
+    def __init__(self, workers=None, chunksize=DEFAULT_CHUNKSIZE, prewarm_years=None, max_pending_chunks=2,
+                 chunk_func=_compute_chunk):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        # 处理一个块（记录列表）并返回等长结果列表的函数，须可在子进程中按名称导入
+        self.chunk_func = chunk_func
+        self.max_pending = self.workers * max_pending_chunks
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(prewarm_years,)
+        )
+
+    def map(self, records, ordered=True):
+        """计算(datetime, 经度)记录（或chunk_func接受的任意记录）
+
+        ordered为True时按输入顺序逐个产出结果；为False时按完成顺序产出(下标, 结果)。
+        """
+        if ordered:
+            return self._map_ordered(records)
+        return self._map_unordered(records)
+
+    def _map_ordered(self, records):
+        pending = deque()
+        for chunk in _chunks(records, self.chunksize):
+            pending.append(self._executor.submit(self.chunk_func, chunk))
+            if len(pending) >= self.max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def _map_unordered(self, records):
+        pending = {}
+        start = 0
+        for chunk in _chunks(records, self.chunksize):
+            pending[self._executor.submit(self.chunk_func, chunk)] = start
+            start += len(chunk)
+            if len(pending) >= self.max_pending:
+                yield from self._drain(pending)
+        while pending:
+            yield from self._drain(pending)
+
+    @staticmethod
+    def _drain(pending):
+        """等待至少一个块完成，产出其中的(下标, 结果)"""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            start = pending.pop(future)
+            for offset, chart in enumerate(future.result()):
+                yield start + offset, chart
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def compute_charts(records, workers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """一次性计算全部记录并按输入顺序返回列表"""
+    with ChartPool(workers, chunksize) as pool:
+        return list(pool.map(records))
+
+
+def _bench_records(count):
+    """生成分布在1950-2010年间的测试记录"""
+    start = datetime.datetime(1950, 1, 1)
+    step = datetime.timedelta(minutes=(60 * 365 * 24 * 60) // count)
+    return ((start + step * i, 73.0 + (i % 620) / 10) for i in range(count))
+
+
+def bench(count, max_workers, chunksize):
+    """依次用1..max_workers个进程计算count个命盘，输出吞吐量与加速比"""
+    baseline = None
+    steps = sorted({2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers} | {max_workers})
+    for workers in steps:
+        with ChartPool(workers, chunksize) as pool:
+            # 预热：让每个子进程完成初始化
+            for _ in pool.map(_bench_records(workers * chunksize)):
+                pass
+            started = time.perf_counter()
+            for _ in pool.map(_bench_records(count), ordered=False):
+                pass
+            elapsed = time.perf_counter() - started
+        rate = count / elapsed
+        baseline = baseline or rate
+        print(f'workers={workers:<3d} {rate:10.0f} 盘/秒  加速比 {rate / baseline:5.2f}x', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多进程八字计算基准测试')
+    parser.add_argument('--bench', action='store_true', help='运行基准测试')
+    parser.add_argument('--count', type=int, default=100000, help='每轮计算的命盘数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='最大进程数')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+    if not args.bench:
+        parser.print_help()
+        return
+    bench(args.count, args.workers, args.chunksize)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""合婚匹配
+
+两张命盘的匹配分由四部分相加（权重见下方常量）：
+
+    日主    双方日干的关系：五合、相生、比和、相克
+    地支    四柱同位地支的六合、半合、六冲、相刑、相害，按柱位加权
+    纳音    双方年柱纳音五行的生克
+    神煞    双方共有的神煞，以及对方日支引动的己方神煞（反之亦然）
+
+一人对多人匹配时，候选命盘先整理为ChartMatrix（四柱序号及导出的天干、地支、纳音五行、
+神煞掩码等整数数组），各项得分由预先建好的查找表按数组整体取值相加，不对候选逐个循环；
+取前k名用argpartition，只对入选的k个排序。
+
+    python compat.py --bench 100000
+
+依赖numpy。handler不导入本模块，numpy也未列入requirements.txt（Vercel函数限制15MB），
+在批量匹配的服务或脚本中另行安装。
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_core import NAYIN_TABLE, PILLARS, WUXING
+from interactions import BRANCH_RELATION_TABLE, STEM_RELATION_TABLE, element_relation
+from packed import unpack_header
+from shensha import (
+    DAY_MASKS, EXTERNAL_POSITION, SHENSHA_NAMES, YEAR_MASKS, external_pillar_mask, mask_names, shen_sha_masks
+)
+
+# 日主关系得分
+DAY_MASTER_SCORES = {"合": 30, "生": 15, "被生": 15, "比和": 5, "克": -15, "被克": -15}
+# 地支关系得分
+BRANCH_SCORES = {"六合": 10, "半合": 6, "六冲": -10, "相刑": -6, "相害": -5}
+# 四柱同位地支相比的权重（年、月、日、时）
+PILLAR_WEIGHTS = (2, 1, 3, 1)
+# 年柱纳音五行关系得分
+NAYIN_SCORES = {"生": 10, "被生": 10, "比和": 5, "克": -10, "被克": -10}
+# 双方共有的神煞、对方日支引动的神煞，每个的得分
+SHARED_SHEN_SHA_SCORE = 2
+CROSS_SHEN_SHA_SCORE = 3
+
+PILLAR_KEYS = ('year', 'month', 'day', 'hour')
+
+# 神煞掩码以uint64数组存放
+if len(SHENSHA_NAMES) > 64:
+    raise ImportError(f'神煞共{len(SHENSHA_NAMES)}个，超出uint64掩码的64位')
+
+# 干支序号 -> 纳音五行下标（纳音名称的最后一字，如"海中金"为金）
+NAYIN_ELEMENT = tuple(WUXING.index(name[-1]) for name in NAYIN_TABLE)
+
+# 数组版查找表
+_STEM_SCORES = np.array([[DAY_MASTER_SCORES[relation] for relation in row] for row in STEM_RELATION_TABLE],
+                        dtype=np.int32)
+_BRANCH_SCORES = np.array([[sum(BRANCH_SCORES[name] for name in names) for names in row]
+                           for row in BRANCH_RELATION_TABLE], dtype=np.int32)
+_NAYIN_SCORES = np.array([[NAYIN_SCORES[element_relation(a, b)] for b in range(5)] for a in range(5)],
+                         dtype=np.int32)
+_NAYIN_ELEMENT = np.array(NAYIN_ELEMENT, dtype=np.intp)
+_DAY_MASKS = np.array(DAY_MASKS, dtype=np.uint64)
+_YEAR_MASKS = np.array(YEAR_MASKS, dtype=np.uint64)
+
+if hasattr(np, 'bitwise_count'):  # numpy>=2.0
+    def _popcount(masks):
+        """uint64掩码数组中各元素的置位数"""
+        return np.bitwise_count(masks).astype(np.int32)
+else:
+    # 按字节查表：每个掩码视为8个uint8
+    _BYTE_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int32)
+
+    def _popcount(masks):
+        """uint64掩码数组中各元素的置位数"""
+        masks = np.ascontiguousarray(masks, dtype=np.uint64)
+        return _BYTE_POPCOUNT[masks.view(np.uint8)].reshape(masks.shape + (8,)).sum(axis=-1, dtype=np.int32)
+
+# 命盘的四柱，供explain使用（Chart或ChartMatrix.pillars_at的结果）
+Pillars = namedtuple('Pillars', PILLAR_KEYS)
+
+
+class ChartMatrix:
+    """多张命盘的整数数组表示，每行为一张命盘
+
+    pillars为(N, 4)的四柱序号；stems、branches为对应的天干、地支，nayin为年柱纳音五行，
+    shen_sha为四柱神煞掩码的并集，year_base、day_base为年柱、日柱序号乘12（查神煞表用）。
+    """
+
+    __slots__ = ('pillars', 'stems', 'branches', 'nayin', 'shen_sha', 'year_base', 'day_base')
+
+    def __init__(self, pillars):
+        pillars = np.asarray(pillars, dtype=np.intp).reshape(-1, 4)
+        self.pillars = pillars
+        self.stems = pillars % 10
+        self.branches = pillars % 12
+        self.nayin = _NAYIN_ELEMENT[pillars[:, 0]]
+        self.year_base = pillars[:, 0] * 12
+        self.day_base = pillars[:, 2] * 12
+        shen_sha = np.zeros(len(pillars), dtype=np.uint64)
+        for position in range(4):
+            branches = self.branches[:, position]
+            shen_sha |= _DAY_MASKS[position][self.day_base + branches]
+            shen_sha |= _YEAR_MASKS[position][self.year_base + branches]
+        self.shen_sha = shen_sha
+
+    @classmethod
+    def from_charts(cls, charts):
+        return cls([[pillar.index for pillar in chart.pillars] for chart in charts])
+
+    @classmethod
+    def from_packed(cls, data):
+        """由packed格式（application/x-bazi-packed）的数据直接建成，无需逐个解码"""
+        _, record_size, body = unpack_header(data)
+        records = np.frombuffer(body, dtype=np.uint8).reshape(-1, record_size)
+        return cls(records[:, :4])
+
+    def __len__(self):
+        return len(self.pillars)
+
+    def pillars_at(self, index):
+        """第index张命盘的四柱"""
+        return Pillars(*(PILLARS[i] for i in self.pillars[index]))
+
+
+def score_many(chart, candidates):
+    """chart与candidates（ChartMatrix）中每张命盘的匹配分，返回int32数组"""
+    year, month, day, hour = chart.year, chart.month, chart.day, chart.hour
+
+    scores = _STEM_SCORES[day.stem][candidates.stems[:, 2]]
+    for position, pillar in enumerate((year, month, day, hour)):
+        scores += PILLAR_WEIGHTS[position] * _BRANCH_SCORES[pillar.branch][candidates.branches[:, position]]
+    scores += _NAYIN_SCORES[NAYIN_ELEMENT[year.index]][candidates.nayin]
+
+    # 神煞：共有的，以及双方日支各自引动对方的
+    own = 0
+    for mask in shen_sha_masks(year, month, day, hour):
+        own |= mask
+    cross_masks = np.array([external_pillar_mask(year, day, branch) for branch in range(12)], dtype=np.uint64)
+    cross = _popcount(cross_masks[candidates.branches[:, 2]])
+    cross += _popcount(_DAY_MASKS[EXTERNAL_POSITION][candidates.day_base + day.branch]
+                       | _YEAR_MASKS[EXTERNAL_POSITION][candidates.year_base + day.branch])
+    scores += SHARED_SHEN_SHA_SCORE * _popcount(candidates.shen_sha & np.uint64(own))
+    scores += CROSS_SHEN_SHA_SCORE * cross
+    return scores
+
+
+def top_k(chart, candidates, k=20):
+    """匹配分最高的k张命盘，返回(下标数组, 得分数组)，按得分从高到低、同分按下标排列"""
+    scores = score_many(chart, candidates)
+    if k < len(scores):
+        selected = np.argpartition(-scores, k - 1)[:k]
+    else:
+        selected = np.arange(len(scores))
+    order = np.lexsort((selected, -scores[selected]))
+    selected = selected[order]
+    return selected, scores[selected]
+
+
+def explain(chart, other):
+    """两张命盘（Chart或Pillars）的匹配分明细，总分与score_many一致"""
+    day_master = STEM_RELATION_TABLE[chart.day.stem][other.day.stem]
+    result = {
+        "dayMaster": {"relation": day_master, "score": DAY_MASTER_SCORES[day_master]},
+        "branches": {},
+    }
+    total = DAY_MASTER_SCORES[day_master]
+    pillars = (chart.year, chart.month, chart.day, chart.hour)
+    other_pillars = (other.year, other.month, other.day, other.hour)
+    for position, key in enumerate(PILLAR_KEYS):
+        names = BRANCH_RELATION_TABLE[pillars[position].branch][other_pillars[position].branch]
+        score = PILLAR_WEIGHTS[position] * sum(BRANCH_SCORES[name] for name in names)
+        result["branches"][key] = {"relations": list(names), "score": score}
+        total += score
+
+    na_yin = element_relation(NAYIN_ELEMENT[chart.year.index], NAYIN_ELEMENT[other.year.index])
+    result["naYin"] = {"relation": na_yin, "score": NAYIN_SCORES[na_yin]}
+    total += NAYIN_SCORES[na_yin]
+
+    own = other_own = 0
+    for mask in shen_sha_masks(*pillars):
+        own |= mask
+    for mask in shen_sha_masks(*other_pillars):
+        other_own |= mask
+    shared = mask_names(own & other_own)
+    cross = (list(mask_names(external_pillar_mask(chart.year, chart.day, other.day.branch)))
+             + list(mask_names(external_pillar_mask(other.year, other.day, chart.day.branch))))
+    score = SHARED_SHEN_SHA_SCORE * len(shared) + CROSS_SHEN_SHA_SCORE * len(cross)
+    result["shenSha"] = {"shared": list(shared), "cross": cross, "score": score}
+    total += score
+
+    result["score"] = total
+    return result
+
+
+def bench(count, k=20, seed=0):
+    """随机生成count张候选命盘，输出一对多匹配的耗时，并用explain核对部分得分"""
+    from bazi_with_sxtwl import build_chart
+
+    rng = random.Random(seed)
+    charts = [
+        build_chart(datetime.datetime(rng.randint(1950, 2005), rng.randint(1, 12), rng.randint(1, 28),
+                                      rng.randint(0, 23), rng.randint(0, 59)), rng.uniform(73, 135))
+        for _ in range(count + 1)
+    ]
+    chart, candidates = charts[0], charts[1:]
+
+    started = time.perf_counter()
+    matrix = ChartMatrix.from_charts(candidates)
+    built = time.perf_counter()
+    scores = score_many(chart, matrix)
+    scored = time.perf_counter()
+    indices, top_scores = top_k(chart, matrix, k)
+    ranked = time.perf_counter()
+
+    for i in range(min(count, 2000)):
+        if explain(chart, candidates[i])["score"] != scores[i]:
+            raise AssertionError(f'第{i}个候选的得分与explain不一致')
+    print(f'{count}个候选：建表 {(built - started) * 1e3:.1f} 毫秒，'
+          f'评分 {(scored - built) * 1e3:.1f} 毫秒，前{k}名 {(ranked - scored) * 1e3:.1f} 毫秒')
+    print('前5名:', ', '.join(f'{candidates[i]!r}={s}' for i, s in zip(indices[:5], top_scores[:5])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合婚一对多匹配的耗时测试')
+    parser.add_argument('--bench', type=int, metavar='COUNT', default=100000, help='候选命盘数量')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    bench(args.bench, args.top, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""大运与流年
+
+大运从月柱起排：阳年男命、阴年女命顺排，阴年男命、阳年女命逆排。
+起运岁数按出生时刻到下一个节（顺排）或上一个节（逆排）的时间折算：
+三天为一年、一天为四个月、一个时辰为十天，即每12分钟折一天（一年按360天计）。
+节气时刻取自jieqi的节气表，精确到分钟，不调用sxtwl。
+
+各运、各年的十神、纳音只取决于日干与本柱干支，导入时预先建成PILLAR_INFO表；
+神煞只取决于本柱地支，每张命盘按十二地支各算一次。之后逐年只做整数运算与查表，
+按需生成（Timeline.da_yun / Timeline.liu_nian均为生成器）。
+
+可选的interactions为各运、各年与命盘四柱的作用关系（见interactions.pillar_interactions），
+只取决于本柱干支，每张命盘按用到的干支各算一次。
+"""
+import calendar
+import datetime
+from collections import namedtuple
+
+from bazi_core import PILLARS, RELATIVE_TABLE
+from bazi_with_sxtwl import build_chart, resolve_times
+from interactions import PILLAR_KEYS, interactions_to_dict, pillar_interactions
+from jieqi import get_jie_table, to_minutes
+from shensha import external_pillar_mask, mask_names
+
+# 默认排10步大运、100年流年
+DEFAULT_DA_YUN_COUNT = 10
+DEFAULT_LIU_NIAN_YEARS = 100
+
+# 每步大运的年数
+DA_YUN_YEARS = 10
+
+# 起运折算：每12分钟折一天，一月30天，一年360天
+MINUTES_PER_DAY = 12
+
+GENDERS = {'male': True, 'm': True, '男': True, 'female': False, 'f': False, '女': False}
+
+# 起运时间（年、月、日）
+StartAge = namedtuple('StartAge', ['years', 'months', 'days'])
+
+# 一步大运：第几步（从1起）、干支、起止公历年（含）
+DaYun = namedtuple('DaYun', ['step', 'pillar', 'start_year', 'end_year'])
+
+# 一年流年：公历年、虚岁、干支、所在大运（起运前为None）
+LiuNian = namedtuple('LiuNian', ['year', 'age', 'pillar', 'da_yun'])
+
+
+def is_male(gender):
+    """性别（male/female或男/女）转换为是否男命，无法识别时抛出ValueError"""
+    try:
+        return GENDERS[str(gender).strip().lower()]
+    except KeyError:
+        raise ValueError(f'无法识别的性别: {gender}') from None
+
+
+def _add_months(date, months):
+    """加若干个月，日期超出当月天数时取月末"""
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def start_age(minutes):
+    """到交节的分钟数折算为起运时间"""
+    days = minutes // MINUTES_PER_DAY
+    return StartAge(days // 360, days % 360 // 30, days % 30)
+
+
+# 作用关系中大运、流年一柱的名称
+DA_YUN_KEYS = PILLAR_KEYS + ('daYun',)
+LIU_NIAN_KEYS = PILLAR_KEYS + ('liuNian',)
+
+# PILLAR_INFO[日干][干支序号] = (干支, 天干十神, 藏干十神, 纳音)
+PILLAR_INFO = tuple(
+    tuple((pillar.name, row[pillar.index].gan_shen, list(row[pillar.index].zhi_shen), pillar.na_yin)
+          for pillar in PILLARS)
+    for row in RELATIVE_TABLE
+)
+
+
+class Timeline:
+    """一张命盘的大运、流年"""
+
+    __slots__ = ('chart', 'birth_date', 'forward', 'start_age', 'start_date', 'shen_sha_masks',
+                 '_relative', '_shen_sha', '_interactions')
+
+    def __init__(self, chart, birth_date, forward, start_age, start_date):
+        self.chart = chart
+        self.birth_date = birth_date
+        self.forward = forward
+        self.start_age = start_age
+        self.start_date = start_date
+        self._relative = PILLAR_INFO[chart.day.stem]
+        # 大运、流年的神煞只取决于其地支，按十二地支各算一次
+        self.shen_sha_masks = tuple(external_pillar_mask(chart.year, chart.day, branch) for branch in range(12))
+        self._shen_sha = tuple(list(mask_names(mask)) for mask in self.shen_sha_masks)
+        self._interactions = {}
+
+    def da_yun(self, count=DEFAULT_DA_YUN_COUNT):
+        """逐步生成大运"""
+        first_year = self.start_date.year
+        for step in range(1, count + 1):
+            start_year = first_year + (step - 1) * DA_YUN_YEARS
+            yield DaYun(step, self.da_yun_pillar(step), start_year, start_year + DA_YUN_YEARS - 1)
+
+    def da_yun_pillar(self, step):
+        """第step步大运的干支"""
+        return PILLARS[(self.chart.month.index + (step if self.forward else -step)) % 60]
+
+    def liu_nian_steps(self, years=DEFAULT_LIU_NIAN_YEARS, count=DEFAULT_DA_YUN_COUNT):
+        """逐年生成(公历年, 虚岁, 流年干支序号, 大运步数)，起运前或超出count步时步数为0"""
+        birth_year = self.birth_date.year
+        first_year = self.start_date.year
+        for year in range(birth_year, birth_year + years):
+            step = (year - first_year) // DA_YUN_YEARS + 1
+            yield year, year - birth_year + 1, (year - 4) % 60, step if 0 < step <= count else 0
+
+    def liu_nian(self, years=DEFAULT_LIU_NIAN_YEARS, count=DEFAULT_DA_YUN_COUNT):
+        """从出生年起逐年生成流年；公历年的干支按立春换年，即该年立春之后的干支"""
+        da_yun = (None,) + tuple(self.da_yun(count))
+        for year, age, index, step in self.liu_nian_steps(years, count):
+            yield LiuNian(year, age, PILLARS[index], da_yun[step])
+
+    def pillar_info(self, pillar):
+        """某柱相对命盘的(干支, 十神, 藏干十神, 纳音, 神煞)"""
+        return self._relative[pillar.index] + (self._shen_sha[pillar.branch],)
+
+    def interactions(self, index):
+        """干支序号为index的一柱（大运、流年）与命盘四柱的作用关系，返回(天干关系列表, 地支关系列表)"""
+        try:
+            return self._interactions[index]
+        except KeyError:
+            chart = self.chart
+            value = self._interactions[index] = pillar_interactions(
+                chart.year, chart.month, chart.day, chart.hour, PILLARS[index])
+            return value
+
+    def iter_da_yun_dicts(self, count=DEFAULT_DA_YUN_COUNT, interactions=False):
+        for item in self.da_yun(count):
+            gan_zhi, gan_shen, zhi_shen, na_yin, shen_sha = self.pillar_info(item.pillar)
+            row = {"ganZhi": gan_zhi, "ganShen": gan_shen, "zhiShen": zhi_shen, "naYin": na_yin,
+                   "shenSha": shen_sha, "step": item.step, "startYear": item.start_year, "endYear": item.end_year}
+            if interactions:
+                row["interactions"] = interactions_to_dict(*self.interactions(item.pillar.index), DA_YUN_KEYS)
+            yield row
+
+    def iter_liu_nian_dicts(self, years=DEFAULT_LIU_NIAN_YEARS, count=DEFAULT_DA_YUN_COUNT, interactions=False):
+        # 不经过LiuNian，逐年只查表
+        relative = self._relative
+        shen_sha = self._shen_sha
+        names = (None,) + tuple(self.da_yun_pillar(step).name for step in range(1, count + 1))
+        for year, age, index, step in self.liu_nian_steps(years, count):
+            gan_zhi, gan_shen, zhi_shen, na_yin = relative[index]
+            row = {"ganZhi": gan_zhi, "ganShen": gan_shen, "zhiShen": zhi_shen, "naYin": na_yin,
+                   "shenSha": shen_sha[index % 12], "year": year, "age": age, "daYun": names[step]}
+            if interactions:
+                row["interactions"] = interactions_to_dict(*self.interactions(index), LIU_NIAN_KEYS)
+            yield row
+
+    def to_dict(self, years=DEFAULT_LIU_NIAN_YEARS, count=DEFAULT_DA_YUN_COUNT, interactions=False):
+        """序列化为接口返回的字典，interactions为True时各运、各年附带与命盘的作用关系"""
+        return {
+            "direction": "顺" if self.forward else "逆",
+            "startAge": self.start_age._asdict(),
+            "startDate": self.start_date.isoformat(),
+            "daYun": list(self.iter_da_yun_dicts(count, interactions)),
+            "liuNian": list(self.iter_liu_nian_dicts(years, count, interactions))
+        }
+
+
+def build_timeline(dt, longitude, gender, timezone=None, zi_hour=None, chart=None):
+    """计算大运起运时间并返回Timeline，参数含义同build_chart
+
+    已有同一输入的Chart时可通过chart传入以免重复计算；出生时间超出节气表范围时抛出ValueError
+    """
+    beijing_dt, _, civil_dt = resolve_times(dt, longitude, timezone)
+    if chart is None:
+        chart = build_chart(dt, longitude, timezone, zi_hour)
+
+    table = get_jie_table()
+    minutes = to_minutes(beijing_dt)
+    index = table.locate(minutes)
+    if index is None:
+        raise ValueError(f'出生时间超出节气表范围（{table.start_year}-{table.end_year}年），无法计算起运')
+    previous_jie, next_jie = table.jie_range(index)
+
+    # 阳年男命、阴年女命顺排
+    forward = (chart.year.stem % 2 == 0) == is_male(gender)
+    age = start_age(next_jie - minutes if forward else minutes - previous_jie)
+    birth_date = civil_dt.date()
+    start_date = _add_months(birth_date, age.years * 12 + age.months) + datetime.timedelta(days=age.days)
+    return Timeline(chart, birth_date, forward, age, start_date)
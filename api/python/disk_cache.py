@@ -0,0 +1,313 @@
+"""命盘结果的磁盘缓存（SQLite，WAL模式）
+
+进程内的ChartCache在每次冷启动后为空，也不能在多个worker进程之间共享。
+设置BAZI_DISK_CACHE为数据库文件路径后，chart_cache在进程内缓存未命中时再查这里，
+算出的结果同时写入，同一台机器上的各进程及重启后的进程都可直接取用。
+
+键与ChartCache相同（真太阳时分钟数、取整后的经度、字段列表、子时规则等，见ChartCache.normalize），
+值为编码后的命盘字节（键以格式名结尾；cached_calculate_bazi解码JSON格式的条目，
+与cached_chart_bytes、preload共用）。数据库记录写入时的ENGINE_VERSION，与当前不同（排盘算法或输出字段变化）
+时打开即清空。条数超过上限时按写入顺序删除最早的记录。
+
+环境变量：
+    BAZI_DISK_CACHE           数据库文件路径，未设置时不启用（Vercel上可用/tmp下的路径）
+    BAZI_DISK_CACHE_MAX_ROWS  最多保存的条数，默认200000
+
+预先写入一批输入（NDJSON，每行一个userData）的结果：
+
+    python disk_cache.py preload users.ndjson --db /tmp/bazi_cache.db
+    python disk_cache.py stats --db /tmp/bazi_cache.db
+
+核对preload写入的条目能被cached_calculate_bazi（worker.py的路径）取用且结果与calculate_bazi相同
+（使用临时数据库，vercel-build.sh在构建时也会运行）：
+
+    python disk_cache.py check 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_core import CHART_FIELDS, DEFAULT_FIELDS
+from jieqi import BUNDLED_TABLE_PATH, DEFAULT_END_YEAR, DEFAULT_START_YEAR
+from solar_time import EQUATION_OF_TIME
+
+# 排盘算法（resolve_pillars、build_chart、各字段的计算）或键的格式变化时加1，使旧的缓存失效；
+# 2：键中总是带有子时规则；3：cached_calculate_bazi改用JSON格式的条目
+ENGINE_REVISION = 3
+
+
+def _data_fingerprint():
+    """排盘所用数据的CRC32：附带的节气表文件、节气表范围、均时差表与sxtwl版本"""
+    try:
+        from importlib.metadata import version
+        sxtwl_version = version('sxtwl')
+    except Exception:
+        sxtwl_version = 'unknown'
+    try:
+        with open(BUNDLED_TABLE_PATH, 'rb') as f:
+            crc = zlib.crc32(f.read())
+    except OSError:
+        crc = 0
+    extra = f'{DEFAULT_START_YEAR}-{DEFAULT_END_YEAR}|{sxtwl_version}|'
+    extra += ','.join(str(delta.total_seconds()) for delta in EQUATION_OF_TIME)
+    return zlib.crc32(extra.encode('utf-8'), crc)
+
+
+# 输出字段、默认字段（键中字段列表为None时）或排盘数据（重新生成节气表、升级sxtwl等）变化时自动失效，
+# 只改算法代码时须手动增加ENGINE_REVISION。
+# 默认子时规则（BAZI_ZI_HOUR）不计入：键中已带有解析后的规则，设置不同的进程可共用同一数据库
+ENGINE_VERSION = (f'{ENGINE_REVISION}-'
+                  f'{zlib.crc32(",".join(CHART_FIELDS + ("|",) + DEFAULT_FIELDS).encode("utf-8")):08x}-'
+                  f'{_data_fingerprint():08x}')
+
+DEFAULT_MAX_ROWS = 200000
+# 每写入多少条检查一次条数上限
+_TRIM_INTERVAL = 256
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS charts (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, value BLOB NOT NULL)',
+)
+
+
+def encode_key(key):
+    """ChartCache的键（由数字、字符串、元组、None组成）转换为数据库中的文本键"""
+    return repr(key)
+
+
+class DiskCache:
+    """多进程共享的SQLite缓存，记录命中、未命中与出错次数
+
+    读写出错（如磁盘已满、数据库被锁）只计入errors，不影响调用方
+    """
+
+    def __init__(self, path, max_rows=DEFAULT_MAX_ROWS, engine_version=ENGINE_VERSION):
+        self.path = path
+        self.max_rows = max_rows
+        self.engine_version = engine_version
+        self._lock = threading.Lock()
+        self._connection = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+                row = connection.execute("SELECT value FROM meta WHERE name = 'engine'").fetchone()
+                if row is None or row[0] != self.engine_version:
+                    connection.execute('DELETE FROM charts')
+                    connection.execute("INSERT OR REPLACE INTO meta VALUES ('engine', ?)", (self.engine_version,))
+            self._connection = connection
+        return self._connection
+
+    def get(self, key):
+        """命中时返回缓存的字节，否则返回None"""
+        with self._lock:
+            try:
+                row = self._connect().execute('SELECT value FROM charts WHERE key = ?',
+                                              (encode_key(key),)).fetchone()
+            except sqlite3.Error:
+                self.errors += 1
+                return None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return bytes(row[0])
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        """在一个事务中写入[(键, 字节)]"""
+        if self.max_rows <= 0:
+            return
+        rows = [(encode_key(key), value) for key, value in items]
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.executemany('INSERT OR REPLACE INTO charts (key, value) VALUES (?, ?)', rows)
+                    self._writes += len(rows)
+                    if self._writes >= _TRIM_INTERVAL:
+                        self._writes = 0
+                        self._trim(connection)
+            except sqlite3.Error:
+                self.errors += 1
+
+    def _trim(self, connection):
+        """删除超出条数上限的最早记录（id按写入顺序递增）"""
+        connection.execute(
+            'DELETE FROM charts WHERE id <= (SELECT id FROM charts ORDER BY id DESC LIMIT 1 OFFSET ?)',
+            (self.max_rows,)
+        )
+
+    def clear(self):
+        with self._lock:
+            with self._connect() as connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('DELETE FROM charts')
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM charts').fetchone()[0]
+
+    def stats(self):
+        """命中统计；handler.py的/stats会公开返回，因此不含数据库文件路径"""
+        lookups = self.hits + self.misses
+        return {
+            'engine': self.engine_version,
+            'maxRows': self.max_rows,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+            'errors': self.errors
+        }
+
+
+def _from_env():
+    path = os.environ.get('BAZI_DISK_CACHE')
+    if not path:
+        return None
+    return DiskCache(path, max_rows=int(os.environ.get('BAZI_DISK_CACHE_MAX_ROWS', DEFAULT_MAX_ROWS)))
+
+
+# 由环境变量配置的默认实例，未启用时为None
+disk_cache = _from_env()
+
+
+def preload(cache, rows, fields=None, response_format=None, batch_size=1000):
+    """计算rows（bulk_cli.read_ndjson的结果）中各userData的命盘并写入cache，返回(写入条数, 出错条数)"""
+    from bazi_with_sxtwl import build_chart
+    from chart_cache import chart_cache
+    from chart_input import ChartInputError, parse_user_data
+    from response_formats import JsonFormat
+
+    response_format = response_format or JsonFormat
+    written = failed = 0
+    batch = []
+    for _, user_data in rows:
+        if isinstance(user_data, str):
+            failed += 1
+            continue
+        try:
+            dt, longitude, timezone, zi_hour = parse_user_data(user_data)
+            key, dt, longitude, fields = chart_cache.normalize(dt, longitude, fields, timezone, zi_hour)
+            encoded = response_format.chart(build_chart(dt, longitude, timezone, zi_hour), fields or DEFAULT_FIELDS)
+        except (ChartInputError, ValueError, TypeError, OverflowError):
+            failed += 1
+            continue
+        batch.append((key + (response_format.name,), encoded))
+        if len(batch) >= batch_size:
+            cache.put_many(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        cache.put_many(batch)
+        written += len(batch)
+    return written, failed
+
+
+def check(count, seed=0):
+    """在临时数据库中preload count个随机输入，核对cached_calculate_bazi全部命中且结果与calculate_bazi相同"""
+    from bazi_with_sxtwl import ZI_HOUR_CONVENTIONS, calculate_bazi
+    from chart_cache import ChartCache, cached_calculate_bazi
+    from chart_input import parse_user_data
+
+    rng = random.Random(seed)
+    rows = []
+    for line_no in range(count):
+        user_data = {'birthYear': rng.randint(1801, 2199), 'birthMonth': rng.randint(1, 12),
+                     'birthDay': rng.randint(1, 28), 'birthHour': rng.randint(0, 23),
+                     'birthMinute': rng.randint(0, 59), 'longitude': round(rng.uniform(73, 135), 4)}
+        if rng.random() < 0.3:
+            user_data['ziHour'] = rng.choice(ZI_HOUR_CONVENTIONS)
+        rows.append((line_no, user_data))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskCache(os.path.join(directory, 'check.db'))
+        written, failed = preload(cache, rows)
+        if written != count:
+            raise AssertionError(f'preload写入{written}条，出错{failed}条')
+        # 进程内缓存不保存，每次都经过磁盘缓存
+        memory = ChartCache(maxsize=0)
+        for _, user_data in rows:
+            dt, longitude, timezone, zi_hour = parse_user_data(user_data)
+            result = cached_calculate_bazi(dt, longitude, cache=memory, timezone=timezone, zi_hour=zi_hour, disk=cache)
+            expected = calculate_bazi(dt.replace(second=0), round(longitude, memory.longitude_precision),
+                                      timezone=timezone, zi_hour=zi_hour)
+            if result != expected:
+                raise AssertionError(f'磁盘缓存的结果与calculate_bazi不一致: {user_data}')
+        if cache.hits != count or cache.misses:
+            raise AssertionError(f'preload的条目未被cached_calculate_bazi取用：命中{cache.hits}，未命中{cache.misses}')
+        cache.close()
+    print(f'preload的{count}个命盘均由cached_calculate_bazi从磁盘缓存取得，结果与calculate_bazi相同')
+
+
+def main(argv=None):
+    from bulk_cli import read_ndjson
+    from response_formats import FORMATS
+
+    formats = {response_format.name: response_format for response_format in FORMATS.values()}
+    parser = argparse.ArgumentParser(description='命盘磁盘缓存')
+    # --db放在各子命令上，写在子命令之后
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument('--db', default=os.environ.get('BAZI_DISK_CACHE'), help='数据库文件，默认取BAZI_DISK_CACHE')
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('preload', parents=[database], help='计算NDJSON输入中的命盘并写入缓存')
+    load.add_argument('input', nargs='?', default='-', help='输入文件，默认或为-时读取stdin')
+    load.add_argument('--format', choices=sorted(formats), default='json', help='缓存的响应格式')
+    commands.add_parser('stats', parents=[database], help='显示条数与引擎版本')
+    commands.add_parser('clear', parents=[database], help='清空缓存')
+    verify = commands.add_parser('check', help='核对preload的条目能被cached_calculate_bazi取用（使用临时数据库）')
+    verify.add_argument('count', nargs='?', type=int, default=200)
+    verify.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.command == 'check':
+        check(args.count, args.seed)
+        return
+    if not args.db:
+        parser.error('需要--db或BAZI_DISK_CACHE')
+
+    cache = DiskCache(args.db, max_rows=int(os.environ.get('BAZI_DISK_CACHE_MAX_ROWS', DEFAULT_MAX_ROWS)))
+    if args.command == 'preload':
+        started = time.perf_counter()
+        if args.input == '-':
+            written, failed = preload(cache, read_ndjson(sys.stdin), response_format=formats[args.format])
+        else:
+            with open(args.input, encoding='utf-8') as f:
+                written, failed = preload(cache, read_ndjson(f), response_format=formats[args.format])
+        print(f'写入{written}条，出错{failed}条，耗时{time.perf_counter() - started:.2f}秒')
+    elif args.command == 'clear':
+        cache.clear()
+    print(f'{args.db}：{len(cache)}条，引擎版本{cache.engine_version}')
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
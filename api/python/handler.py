@@ -1,54 +1,102 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import datetime
 import os
 import sys
+from urllib.parse import parse_qs, urlsplit
 
 # 添加当前目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
-from bazi_with_sxtwl import calculate_bazi
+from bazi_with_sxtwl import DEFAULT_FIELDS, build_chart, get_day_record, prewarm_day_cache_from_env
+from chart_cache import cached_chart_bytes, chart_cache
+from disk_cache import disk_cache
+from chart_input import ChartInputError, parse_fields, parse_user_data, parse_user_data_list
+from dayun import build_timeline
+from response_formats import JsonFormat, negotiate
+from reverse_index import get_reverse_index
+from serializer import dumps, encode_timeline
+
+# 按BAZI_PREWARM_YEARS预热日缓存
+prewarm_day_cache_from_env()
 
 class handler(BaseHTTPRequestHandler):
+    # 请求体大小上限（字节）
+    max_body_bytes = int(os.environ.get('BAZI_MAX_BODY_BYTES', 1024 * 1024))
+    
     def do_POST(self):
         try:
-            # 获取请求体长度
-            content_length = int(self.headers.get('Content-Length', 0))
+            # 获取请求体长度；负数会使rfile.read()一直读到客户端关闭连接
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                content_length = -1
+            if content_length < 0:
+                self.close_connection = True
+                self._send_response(400, {
+                    'error': '无效的Content-Length'
+                })
+                return
+            if content_length > self.max_body_bytes:
+                # 未读取的请求体会污染长连接上的下一个请求，直接关闭连接
+                self.close_connection = True
+                self._send_response(413, {
+                    'error': '请求体过大'
+                })
+                return
             # 读取请求体
             body = self.rfile.read(content_length)
             # 解析JSON
             data = json.loads(body.decode('utf-8'))
+            
+            # 只返回指定字段：请求体的fields优先，其次为查询参数 ?fields=年柱,月柱
+            try:
+                fields = parse_fields(data.get('fields', self._query_fields()))
+            except ChartInputError as e:
+                self._send_response(400, {
+                    'error': str(e)
+                })
+                return
+            
+            # 批量请求
+            if 'userDataList' in data:
+                self._handle_batch(data['userDataList'], fields)
+                return
+            
             user_data = data.get('userData', {})
             
-            # 验证必要的数据
-            required_fields = ['birthYear', 'birthMonth', 'birthDay', 'birthHour', 'birthMinute', 'longitude']
-            for field in required_fields:
-                if field not in user_data:
+            # 验证必要的数据并创建日期时间对象
+            try:
+                birth_time, longitude, timezone, zi_hour = parse_user_data(user_data)
+            except ChartInputError as e:
+                self._send_response(400, {
+                    'error': str(e)
+                })
+                return
+            
+            # 附带大运流年（需userData.gender）：{"chart": ..., "daYun": ...}，只提供JSON格式；
+            # fields含interactions时各运、各年也附带与命盘的作用关系
+            if data.get('daYun'):
+                try:
+                    timeline = build_timeline(birth_time, longitude, user_data.get('gender'), timezone, zi_hour)
+                except ValueError as e:
                     self._send_response(400, {
-                        'error': f'缺少必要字段: {field}'
+                        'error': str(e)
                     })
                     return
+                encoded = cached_chart_bytes(birth_time, longitude, fields, JsonFormat,
+                                             timezone=timezone, zi_hour=zi_hour)
+                self._send_bytes(200, b'{"chart": ' + encoded + b', "daYun": ' + encode_timeline(
+                    timeline, interactions=fields is not None and 'interactions' in fields) + b'}')
+                return
             
-            # 创建日期时间对象
-            birth_time = datetime.datetime(
-                year=user_data['birthYear'],
-                month=user_data['birthMonth'],
-                day=user_data['birthDay'],
-                hour=user_data['birthHour'],
-                minute=user_data['birthMinute']
-            )
-            
-            # 计算八字
-            result = calculate_bazi(birth_time, user_data['longitude'])
+            # 计算八字（缓存的是序列化后的字节），按Accept头选择格式
+            response_format = negotiate(self.headers.get('Accept'))
+            encoded = cached_chart_bytes(birth_time, longitude, fields, response_format,
+                                         timezone=timezone, zi_hour=zi_hour)
             
             # 返回结果
-            self._send_response(200, {
-                'chart': {
-                    **result,
-                    'source': 'sxtwl'
-                }
-            })
+            self._send_bytes(200, response_format.single(encoded, fields), response_format.content_type)
             
         except Exception as e:
             self._send_response(500, {
@@ -56,21 +104,91 @@ class handler(BaseHTTPRequestHandler):
                 'details': str(e)
             })
     
+    def do_GET(self):
+        # 缓存命中统计，用于调整缓存大小
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_response(200, {
+                'cache': chart_cache.stats(),
+                'diskCache': disk_cache.stats() if disk_cache is not None else None,
+                'dayCache': get_day_record.cache_info()._asdict()
+            })
+            return
+        # 八字反查：/reverse?pillars=庚午,辛巳,壬午,甲辰（时柱可省略）
+        if urlsplit(self.path).path.rstrip('/').endswith('/reverse'):
+            self._handle_reverse()
+            return
+        self._send_response(404, {
+            'error': '未找到'
+        })
+    
+    def _handle_reverse(self):
+        """返回四柱对应的出生时间段（北京时间，经度120°）"""
+        values = parse_qs(urlsplit(self.path).query).get('pillars')
+        pillars = [pillar.strip() for pillar in ','.join(values or ()).split(',') if pillar.strip()]
+        if len(pillars) not in (3, 4):
+            self._send_response(400, {
+                'error': 'pillars须为年柱、月柱、日柱[、时柱]，以逗号分隔'
+            })
+            return
+        try:
+            windows = get_reverse_index().find(*pillars)
+        except ValueError as e:
+            self._send_response(400, {
+                'error': str(e)
+            })
+            return
+        self._send_response(200, {
+            'windows': [
+                {'start': f'{start:%Y-%m-%d %H:%M}', 'end': f'{end:%Y-%m-%d %H:%M}'} for start, end in windows
+            ]
+        })
+    
+    def _query_fields(self):
+        """查询参数中的fields，可重复出现或逗号分隔"""
+        values = parse_qs(urlsplit(self.path).query).get('fields')
+        return ','.join(values) if values else None
+    
+    def _handle_batch(self, user_data_list, fields=None):
+        """一次请求计算多个八字，结果顺序与userDataList一致"""
+        try:
+            records = parse_user_data_list(user_data_list)
+        except ChartInputError as e:
+            self._send_response(400, {
+                'error': str(e),
+                'index': e.index
+            })
+            return
+        
+        response_format = negotiate(self.headers.get('Accept'))
+        chart_fields = fields or DEFAULT_FIELDS
+        self._send_bytes(200, response_format.batch([
+            response_format.chart(build_chart(*record), chart_fields) for record in records
+        ], fields), response_format.content_type)
+    
     def do_OPTIONS(self):
-        self._send_cors_headers()
         self.send_response(200)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def _send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.send_header('Access-Control-Max-Age', '86400')
     
     def _send_response(self, status_code, data):
+        self._send_bytes(status_code, dumps(data))
+    
+    def _send_bytes(self, status_code, response, content_type='application/json'):
+        """发送已序列化的响应体"""
         self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        # 响应格式取决于Accept头
+        self.send_header('Vary', 'Accept')
+        self.send_header('Content-Length', str(len(response)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
         self._send_cors_headers()
         self.end_headers()
-        response = json.dumps(data, ensure_ascii=False).encode('utf-8')
         self.wfile.write(response) 
\ No newline at end of file
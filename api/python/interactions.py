@@ -0,0 +1,270 @@
+"""干支作用关系
+
+天干：五合、相冲、五行生克；地支：六合、三合局中两支的半合、六冲、相刑、相害、相破，
+以及三支的三合、三会。
+均以下标（天干0-9、地支0-11、五行按bazi_core.WUXING的顺序0-4）表示，
+导入时建成查找表，供合婚等需要两两比较干支的计算直接查表。
+
+两两关系另建为位集表STEM_PAIR_BITS[干][干]、BRANCH_PAIR_BITS[支][支]（各位见STEM_PAIR_RELATIONS、
+BRANCH_PAIR_RELATIONS），三支关系按地支集合的12位掩码建表TRIPLE_TABLE。
+一张命盘的作用关系（chart_interactions）只需查六对天干、六对地支与一次三支表，
+命盘与大运、流年一柱之间的关系（pillar_interactions，见dayun.Timeline）只需查四对天干、四对地支与一次三支表。
+"""
+from collections import namedtuple
+
+from bazi_core import DIZHI_INDEX, STEM_ELEMENT, WUXING
+
+
+def _branches(names):
+    return tuple(DIZHI_INDEX[name] for name in names)
+
+
+# 五行生克：WUXING为木火土金水，生者为下一位，克者为隔一位
+def generates(element, other):
+    """element是否生other"""
+    return (element + 1) % 5 == other
+
+
+def controls(element, other):
+    """element是否克other"""
+    return (element + 2) % 5 == other
+
+
+def element_relation(element, other):
+    """element相对other的五行关系：比和、生、被生、克、被克"""
+    if element == other:
+        return "比和"
+    if generates(element, other):
+        return "生"
+    if generates(other, element):
+        return "被生"
+    if controls(element, other):
+        return "克"
+    return "被克"
+
+
+# 天干五合：甲己、乙庚、丙辛、丁壬、戊癸，即相差5
+def stems_combine(stem, other):
+    return (stem - other) % 10 == 5
+
+
+# 天干相冲：甲庚、乙辛、丙壬、丁癸（戊己居中不冲）
+def stems_clash(stem, other):
+    return abs(stem - other) == 6 and min(stem, other) < 4
+
+
+# 地支六合：子丑、寅亥、卯戌、辰酉、巳申、午未，即两支之和为1（模12）
+def branches_combine(branch, other):
+    return (branch + other) % 12 == 1
+
+
+# 地支六冲：子午、丑未、寅申、卯酉、辰戌、巳亥，即相差6
+def branches_clash(branch, other):
+    return (branch - other) % 12 == 6
+
+
+# 三合局：申子辰水、亥卯未木、寅午戌火、巳酉丑金，同局两支为半合
+TRIPLE_COMBINATIONS = (
+    (_branches("申子辰"), WUXING.index("水")),
+    (_branches("亥卯未"), WUXING.index("木")),
+    (_branches("寅午戌"), WUXING.index("火")),
+    (_branches("巳酉丑"), WUXING.index("金")),
+)
+
+# 各地支所属的三合局下标（三合局即地支按4取余相同）
+TRIPLE_OF_BRANCH = tuple(next(i for i, (members, _) in enumerate(TRIPLE_COMBINATIONS) if b in members)
+                         for b in range(12))
+
+
+def branches_half_combine(branch, other):
+    """两支同属一个三合局（不含同一地支）"""
+    return branch != other and TRIPLE_OF_BRANCH[branch] == TRIPLE_OF_BRANCH[other]
+
+
+# 相刑：寅巳申无恩之刑、丑戌未恃势之刑、子卯无礼之刑，辰午酉亥自刑
+_PUNISHMENTS = (
+    ("寅", "巳"), ("巳", "申"), ("申", "寅"),
+    ("丑", "戌"), ("戌", "未"), ("未", "丑"),
+    ("子", "卯"), ("卯", "子"),
+    ("辰", "辰"), ("午", "午"), ("酉", "酉"), ("亥", "亥"),
+)
+PUNISHMENTS = frozenset((DIZHI_INDEX[a], DIZHI_INDEX[b]) for a, b in _PUNISHMENTS)
+
+
+def branches_punish(branch, other):
+    """两支相刑（任一方向）"""
+    return (branch, other) in PUNISHMENTS or (other, branch) in PUNISHMENTS
+
+
+# 相害：子未、丑午、寅巳、卯辰、申亥、酉戌，即两支之和为7（模12）
+def branches_harm(branch, other):
+    return (branch + other) % 12 == 7
+
+
+# 相破：子酉、丑辰、寅亥、卯午、巳申、未戌
+_BREAKS = ("子酉", "丑辰", "寅亥", "卯午", "巳申", "未戌")
+BREAKS = frozenset(pair for a, b in _BREAKS for pair in ((DIZHI_INDEX[a], DIZHI_INDEX[b]),
+                                                         (DIZHI_INDEX[b], DIZHI_INDEX[a])))
+
+
+def branches_break(branch, other):
+    return (branch, other) in BREAKS
+
+
+# 三会局：寅卯辰木、巳午未火、申酉戌金、亥子丑水
+DIRECTIONAL_COMBINATIONS = (
+    (_branches("寅卯辰"), WUXING.index("木")),
+    (_branches("巳午未"), WUXING.index("火")),
+    (_branches("申酉戌"), WUXING.index("金")),
+    (_branches("亥子丑"), WUXING.index("水")),
+)
+
+# 地支关系名称及判断函数，按输出顺序
+BRANCH_RELATIONS = (
+    ("六合", branches_combine),
+    ("半合", branches_half_combine),
+    ("六冲", branches_clash),
+    ("相刑", branches_punish),
+    ("相害", branches_harm),
+)
+
+# BRANCH_RELATION_TABLE[支][支] = 关系名称元组
+BRANCH_RELATION_TABLE = tuple(
+    tuple(tuple(name for name, test in BRANCH_RELATIONS if test(a, b)) for b in range(12))
+    for a in range(12)
+)
+
+
+def stem_relation(stem, other):
+    """两干的关系：五合，否则为五行关系（见element_relation）"""
+    if stems_combine(stem, other):
+        return "合"
+    return element_relation(STEM_ELEMENT[stem], STEM_ELEMENT[other])
+
+
+# STEM_RELATION_TABLE[干][干] = 关系名称
+STEM_RELATION_TABLE = tuple(tuple(stem_relation(a, b) for b in range(10)) for a in range(10))
+
+
+# 合化五行：天干五合甲己土、乙庚金、丙辛水、丁壬木、戊癸火；地支六合子丑土、寅亥木、卯戌火、辰酉金、巳申水、午未土
+STEM_COMBINE_ELEMENT = tuple(WUXING.index("土金水木火"[stem % 5]) for stem in range(10))
+BRANCH_COMBINE_ELEMENT = tuple(WUXING.index("土土木火金水土土水金火木"[branch]) for branch in range(12))
+
+# 两两关系的位集：名称、判断函数、合化五行（无则为None），按输出顺序，第i项为第i位
+STEM_PAIR_RELATIONS = (
+    ("五合", stems_combine, lambda stem, other: STEM_COMBINE_ELEMENT[stem]),
+    ("相冲", stems_clash, None),
+)
+BRANCH_PAIR_RELATIONS = (
+    ("六合", branches_combine, lambda branch, other: BRANCH_COMBINE_ELEMENT[branch]),
+    ("半合", branches_half_combine,
+     lambda branch, other: TRIPLE_COMBINATIONS[TRIPLE_OF_BRANCH[branch]][1]),
+    ("六冲", branches_clash, None),
+    ("相刑", branches_punish, None),
+    ("相害", branches_harm, None),
+    ("相破", branches_break, None),
+)
+
+
+def _pair_bits(relations, size):
+    return tuple(
+        tuple(sum(1 << bit for bit, (_, test, _) in enumerate(relations) if test(a, b)) for b in range(size))
+        for a in range(size)
+    )
+
+
+# STEM_PAIR_BITS[干][干]、BRANCH_PAIR_BITS[支][支] = 关系位集
+STEM_PAIR_BITS = _pair_bits(STEM_PAIR_RELATIONS, 10)
+BRANCH_PAIR_BITS = _pair_bits(BRANCH_PAIR_RELATIONS, 12)
+
+
+def _pair_entries(relations, bits):
+    """位集表 -> [a][b] = ((关系名称, 合化五行), ...)"""
+    return tuple(
+        tuple(tuple((name, element(a, b) if element else None)
+                    for bit, (name, _, element) in enumerate(relations) if row[b] >> bit & 1)
+              for b in range(len(row)))
+        for a, row in enumerate(bits)
+    )
+
+
+STEM_PAIR_ENTRIES = _pair_entries(STEM_PAIR_RELATIONS, STEM_PAIR_BITS)
+BRANCH_PAIR_ENTRIES = _pair_entries(BRANCH_PAIR_RELATIONS, BRANCH_PAIR_BITS)
+
+# 三支关系：(名称, 成员地支掩码, 五行)
+_TRIPLES = tuple(
+    (name, sum(1 << branch for branch in members), element)
+    for name, combinations in (("三合", TRIPLE_COMBINATIONS), ("三会", DIRECTIONAL_COMBINATIONS))
+    for members, element in combinations
+)
+
+# TRIPLE_TABLE[地支掩码] = 掩码中成局的三支关系元组
+TRIPLE_TABLE = tuple(tuple(triple for triple in _TRIPLES if mask & triple[1] == triple[1]) for mask in range(1 << 12))
+
+PILLAR_KEYS = ('year', 'month', 'day', 'hour')
+
+# 一条作用关系：positions为参与的柱位下标（0-3为年月日时，4为外来的大运或流年），element为合化五行或None
+Interaction = namedtuple('Interaction', ['positions', 'relation', 'element'])
+
+_PAIRS = ((0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3))
+
+
+def _triples(branches, mask, required=0):
+    """mask中成局且包含required中地支的三支关系，positions为属于该局的各柱"""
+    return [
+        Interaction(tuple(i for i, branch in enumerate(branches) if member_mask >> branch & 1), name, element)
+        for name, member_mask, element in TRIPLE_TABLE[mask] if member_mask & required == required
+    ]
+
+
+def chart_interactions(year, month, day, hour):
+    """四柱（bazi_core.Pillar）之间的作用关系，返回(天干关系列表, 地支关系列表)"""
+    pillars = (year, month, day, hour)
+    stems = [pillar.stem for pillar in pillars]
+    branches = [pillar.branch for pillar in pillars]
+    stem_interactions = []
+    branch_interactions = []
+    for a, b in _PAIRS:
+        for relation, element in STEM_PAIR_ENTRIES[stems[a]][stems[b]]:
+            stem_interactions.append(Interaction((a, b), relation, element))
+        for relation, element in BRANCH_PAIR_ENTRIES[branches[a]][branches[b]]:
+            branch_interactions.append(Interaction((a, b), relation, element))
+    mask = 1 << branches[0] | 1 << branches[1] | 1 << branches[2] | 1 << branches[3]
+    branch_interactions.extend(_triples(branches, mask))
+    return stem_interactions, branch_interactions
+
+
+def pillar_interactions(year, month, day, hour, other):
+    """四柱与外来一柱other（大运、流年）的作用关系，只含other参与的，返回(天干关系列表, 地支关系列表)"""
+    pillars = (year, month, day, hour)
+    stem_interactions = []
+    branch_interactions = []
+    for position, pillar in enumerate(pillars):
+        for relation, element in STEM_PAIR_ENTRIES[pillar.stem][other.stem]:
+            stem_interactions.append(Interaction((position, 4), relation, element))
+        for relation, element in BRANCH_PAIR_ENTRIES[pillar.branch][other.branch]:
+            branch_interactions.append(Interaction((position, 4), relation, element))
+    branches = [pillar.branch for pillar in pillars] + [other.branch]
+    mask = 1 << branches[0] | 1 << branches[1] | 1 << branches[2] | 1 << branches[3] | 1 << branches[4]
+    branch_interactions.extend(_triples(branches, mask, 1 << other.branch))
+    return stem_interactions, branch_interactions
+
+
+def interaction_to_dict(interaction, keys=PILLAR_KEYS + ('other',)):
+    return {
+        "pillars": [keys[position] for position in interaction.positions],
+        "relation": interaction.relation,
+        "element": None if interaction.element is None else WUXING[interaction.element]
+    }
+
+
+def interactions_to_dict(stem_interactions, branch_interactions, keys=PILLAR_KEYS + ('other',)):
+    return {
+        "tianGan": [interaction_to_dict(interaction, keys) for interaction in stem_interactions],
+        "diZhi": [interaction_to_dict(interaction, keys) for interaction in branch_interactions]
+    }
+
+
+def get_chart_interactions(chart):
+    """Chart的interactions字段"""
+    return interactions_to_dict(*chart_interactions(chart.year, chart.month, chart.day, chart.hour))
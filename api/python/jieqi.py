@@ -0,0 +1,171 @@
+"""节气（节）时刻表
+
+每年12个“节”（立春、惊蛰……小寒）决定月柱的切换，立春同时决定年柱。
+表中按时间顺序保存从start_year立春起、到end_year+1立春止的各节时刻，
+以“距EPOCH的分钟数”（北京时间）存储，取节气时刻向上取整的分钟：
+出生分钟数 >= 表中值 即视为已交节。
+
+随模块附带1800-2200年的二进制表（jieqi_1800_2200.bin），加载后按需截取，
+只有所需范围超出该文件时才调用sxtwl现算。范围可由环境变量
+BAZI_JIEQI_START_YEAR / BAZI_JIEQI_END_YEAR 配置。查询为bisect二分，不再做天文计算。
+"""
+import datetime
+import math
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+
+import sxtwl
+
+# 分钟计数的起点（北京时间）
+EPOCH = datetime.datetime(1900, 1, 1)
+# EPOCH对应的儒略日（sxtwl的儒略日以北京时间计）
+EPOCH_JD = 2415020.5
+
+# 默认覆盖范围
+DEFAULT_START_YEAR = int(os.environ.get('BAZI_JIEQI_START_YEAR', 1800))
+DEFAULT_END_YEAR = int(os.environ.get('BAZI_JIEQI_END_YEAR', 2200))
+
+# 随模块附带的预计算表；其内容已计入disk_cache.ENGINE_VERSION，
+# 但修改交节判定（如取整方式、pillar_indices）后须增加disk_cache.ENGINE_REVISION
+BUNDLED_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jieqi_1800_2200.bin')
+
+# 二进制文件头：魔数、格式版本、起止年份；其后为小端int32分钟数
+_FILE_MAGIC = b'JIEQ'
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sHhh')
+
+# 年干支序号 = (年 - 4) % 60，如1984年为甲子(0)
+YEAR_GZ_OFFSET = 4
+# 月干支序号 = (12 * 年 + 寅月起的月序 + 14) % 60，如2000年寅月为戊寅(14)
+MONTH_GZ_OFFSET = 14
+
+# sxtwl节气序号：0冬至 1小寒 2大寒 3立春 …，奇数为“节”
+LICHUN = 3
+
+# 各节通常所在的公历日，作为逐日查找的起点
+_TYPICAL_JIE_DAY = {1: 6, 2: 4, 3: 6, 4: 5, 5: 6, 6: 6, 7: 7, 8: 8, 9: 8, 10: 8, 11: 7, 12: 7}
+_SEARCH_OFFSETS = (0, -1, 1, -2, 2, -3, 3, -4, 4)
+
+
+def to_minutes(dt):
+    """北京时间datetime转换为距EPOCH的分钟数"""
+    return (dt - EPOCH) // datetime.timedelta(minutes=1)
+
+
+def from_minutes(minutes):
+    """距EPOCH的分钟数转换为datetime"""
+    return EPOCH + datetime.timedelta(minutes=minutes)
+
+
+def _find_jie(year, month, hint):
+    """在year年month月中找到“节”所在的日期，返回(sxtwl节气序号, 儒略日)"""
+    for offset in _SEARCH_OFFSETS:
+        day = sxtwl.fromSolar(year, month, max(1, hint + offset))
+        if day.hasJieQi() and day.getJieQi() % 2 == 1:
+            return day.getJieQi(), day.getJieQiJD()
+    raise ValueError(f'{year}年{month}月未找到节气')
+
+
+class JieTable:
+    """按时间排序的节气时刻表"""
+
+    __slots__ = ('start_year', 'end_year', 'minutes')
+
+    def __init__(self, start_year, end_year, minutes):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.minutes = minutes
+
+    @classmethod
+    def build(cls, start_year=DEFAULT_START_YEAR, end_year=DEFAULT_END_YEAR):
+        """调用sxtwl计算[start_year, end_year]内的全部节气时刻"""
+        hints = dict(_TYPICAL_JIE_DAY)
+        jies = []
+        for year in range(start_year, end_year + 2):
+            for month in range(1, 13):
+                index, jd = _find_jie(year, month, hints[month])
+                hints[month] = sxtwl.JD2DD(jd).getDay()
+                jies.append((jd, index))
+
+        # 从start_year立春开始，到end_year+1立春结束
+        first = next(i for i, (_, index) in enumerate(jies) if index == LICHUN)
+        count = (end_year - start_year + 1) * 12 + 1
+        minutes = array('i', (
+            math.ceil(round((jd - EPOCH_JD) * 1440, 6))
+            for jd, _ in jies[first:first + count]
+        ))
+        return cls(start_year, end_year, minutes)
+
+    @classmethod
+    def load(cls, path):
+        """读取save()写出的二进制表"""
+        with open(path, 'rb') as f:
+            magic, version, start_year, end_year = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+            if magic != _FILE_MAGIC or version != _FILE_VERSION:
+                raise ValueError(f'无法识别的节气表文件: {path}')
+            minutes = array('i')
+            minutes.frombytes(f.read())
+        if sys.byteorder == 'big':
+            minutes.byteswap()
+        if len(minutes) != (end_year - start_year + 1) * 12 + 1:
+            raise ValueError(f'节气表文件长度不符: {path}')
+        return cls(start_year, end_year, minutes)
+
+    def save(self, path):
+        """写出为二进制表"""
+        minutes = array('i', self.minutes)
+        if sys.byteorder == 'big':
+            minutes.byteswap()
+        with open(path, 'wb') as f:
+            f.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, self.start_year, self.end_year))
+            f.write(minutes.tobytes())
+
+    def covers(self, start_year, end_year):
+        return self.start_year <= start_year and end_year <= self.end_year
+
+    def slice(self, start_year, end_year):
+        """截取[start_year, end_year]范围的子表"""
+        if not self.covers(start_year, end_year):
+            raise ValueError(f'节气表不包含{start_year}-{end_year}年')
+        first = (start_year - self.start_year) * 12
+        last = (end_year - self.start_year + 1) * 12 + 1
+        return JieTable(start_year, end_year, self.minutes[first:last])
+
+    def locate(self, minutes):
+        """返回minutes所在节的序号（自start_year立春起计），超出范围时返回None"""
+        index = bisect_right(self.minutes, minutes) - 1
+        if index < 0 or index >= len(self.minutes) - 1:
+            return None
+        return index
+
+    def jie_range(self, index):
+        """第index个节的起止分钟数，用于计算距前后节气的时间"""
+        return self.minutes[index], self.minutes[index + 1]
+
+    def pillar_indices(self, minutes):
+        """返回(年干支序号, 月干支序号)，均为0-59；超出范围时返回None"""
+        index = self.locate(minutes)
+        if index is None:
+            return None
+        year = self.start_year + index // 12
+        return (year - YEAR_GZ_OFFSET) % 60, (12 * year + index % 12 + MONTH_GZ_OFFSET) % 60
+
+
+@lru_cache(maxsize=None)
+def get_jie_table(start_year=DEFAULT_START_YEAR, end_year=DEFAULT_END_YEAR):
+    """获取节气表：优先从附带的二进制文件截取，否则调用sxtwl构建"""
+    if os.path.exists(BUNDLED_TABLE_PATH):
+        bundled = JieTable.load(BUNDLED_TABLE_PATH)
+        if bundled.covers(start_year, end_year):
+            return bundled.slice(start_year, end_year)
+    return JieTable.build(start_year, end_year)
+
+
+if __name__ == '__main__':
+    # 重新生成附带的二进制表: python jieqi.py
+    JieTable.build(1800, 2200).save(BUNDLED_TABLE_PATH)
+    print(f'已写入 {BUNDLED_TABLE_PATH}')
@@ -0,0 +1,112 @@
+"""紧凑二进制命盘格式（application/x-bazi-packed）
+
+命盘的全部字段都可由四柱的六十甲子序号、真太阳时与农历日期推出，
+因此只传这些整数，由接收方用decode_packed还原为与JSON接口相同的字典。
+
+布局（小端）：
+
+    头部   B 版本号  B 标志位（bit0：含农历日期）
+    每盘   4B 年/月/日/时柱序号  i 真太阳时（距1900-01-01的分钟数）
+           [h 农历年  B 农历月（bit7为闰月）  B 农历日]   仅当含农历日期时
+
+单盘与批量使用同一格式，批量时各盘依次排列。解码只依赖bazi_core，不需要sxtwl；
+只读取部分字段时可用iter_packed直接得到惰性的Chart，无需还原完整字典。
+"""
+import datetime
+import struct
+from collections import namedtuple
+
+from bazi_core import DEFAULT_FIELDS, PILLARS, Chart
+
+PACKED_CONTENT_TYPE = 'application/x-bazi-packed'
+PACKED_VERSION = 1
+
+# 标志位
+FLAG_LUNAR = 0x01
+
+# 分钟数起点，与jieqi.EPOCH相同（解码端不依赖sxtwl，故不从jieqi导入）
+EPOCH = datetime.datetime(1900, 1, 1)
+
+_HEADER = struct.Struct('<BB')
+_PILLARS = struct.Struct('<4Bi')
+_PILLARS_LUNAR = struct.Struct('<4BihBB')
+_LEAP_BIT = 0x80
+
+# 需要农历日期的字段
+LUNAR_FIELDS = frozenset(('lunarDate', 'zodiac'))
+
+# 解码后供Chart使用的日记录，只含农历字段
+PackedRecord = namedtuple('PackedRecord', ['lunar_year', 'lunar_month', 'lunar_day', 'lunar_leap'])
+
+
+def needs_lunar(fields):
+    """fields（None表示全部）是否包含依赖农历日期的字段"""
+    return fields is None or not LUNAR_FIELDS.isdisjoint(fields)
+
+
+def pack_header(with_lunar):
+    return _HEADER.pack(PACKED_VERSION, FLAG_LUNAR if with_lunar else 0)
+
+
+def pack_chart(chart, with_lunar=True):
+    """编码一张Chart（不含头部）"""
+    true_dt = chart.true_dt
+    minutes = (true_dt - EPOCH) // datetime.timedelta(minutes=1)
+    indices = (chart.year.index, chart.month.index, chart.day.index, chart.hour.index)
+    if not with_lunar:
+        return _PILLARS.pack(*indices, minutes)
+    record = chart.record
+    month = record.lunar_month | (_LEAP_BIT if record.lunar_leap else 0)
+    return _PILLARS_LUNAR.pack(*indices, minutes, record.lunar_year, month, record.lunar_day)
+
+
+def pack_charts(charts, with_lunar=True):
+    """编码多张Chart（含头部）"""
+    return pack_header(with_lunar) + b''.join(pack_chart(chart, with_lunar) for chart in charts)
+
+
+def unpack_header(data):
+    """校验头部，返回(是否含农历日期, 每盘字节数, 头部之后的数据)
+
+    每盘的前4个字节即四柱序号，可直接按定长记录读取（如compat.ChartMatrix.from_packed）
+    """
+    version, flags = _HEADER.unpack_from(data)
+    if version != PACKED_VERSION:
+        raise ValueError(f'不支持的格式版本: {version}')
+    with_lunar = bool(flags & FLAG_LUNAR)
+    record_size = (_PILLARS_LUNAR if with_lunar else _PILLARS).size
+    body = memoryview(data)[_HEADER.size:]
+    if len(body) % record_size:
+        raise ValueError('数据长度不符')
+    return with_lunar, record_size, body
+
+
+def iter_packed(data):
+    """逐个解码为Chart"""
+    with_lunar, _, body = unpack_header(data)
+    layout = _PILLARS_LUNAR if with_lunar else _PILLARS
+
+    for values in layout.iter_unpack(body):
+        year, month, day, hour, minutes = values[:5]
+        record = None
+        if with_lunar:
+            lunar_year, lunar_month, lunar_day = values[5:]
+            record = PackedRecord(lunar_year, lunar_month & ~_LEAP_BIT, lunar_day, bool(lunar_month & _LEAP_BIT))
+        true_dt = EPOCH + datetime.timedelta(minutes=minutes)
+        yield Chart(PILLARS[year], PILLARS[month], PILLARS[day], PILLARS[hour], record, true_dt), with_lunar
+
+
+def decode_packed(data, fields=None):
+    """还原为与JSON接口相同的命盘字典列表（含"source"）
+
+    fields为None时返回默认字段（DEFAULT_FIELDS）；数据不含农历日期时省略lunarDate与zodiac。
+    """
+    charts = []
+    for chart, with_lunar in iter_packed(data):
+        chart_fields = fields or DEFAULT_FIELDS
+        if not with_lunar:
+            chart_fields = tuple(field for field in chart_fields if field not in LUNAR_FIELDS)
+        result = chart.to_dict(chart_fields)
+        result['source'] = 'sxtwl'
+        charts.append(result)
+    return charts
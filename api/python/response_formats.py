@@ -0,0 +1,115 @@
+"""命盘响应格式与内容协商
+
+handler按请求的Accept头选择格式：
+
+    application/json           默认，见serializer
+    application/x-bazi-packed  紧凑整数格式，见packed（用packed.decode_packed还原）
+    application/x-msgpack      MessagePack，字段与JSON相同（需安装msgpack）
+
+每种格式提供：chart() 编码单张命盘（可缓存），single()/batch() 组装成完整响应体。
+错误响应始终为JSON。
+"""
+import struct
+
+from packed import PACKED_CONTENT_TYPE, needs_lunar, pack_chart, pack_header
+from serializer import SOURCE, chart_response, charts_response, encode_chart
+
+try:
+    import msgpack
+except ImportError:  # msgpack为可选依赖
+    msgpack = None
+
+
+class JsonFormat:
+    name = 'json'
+    content_type = 'application/json'
+
+    @staticmethod
+    def chart(chart, fields):
+        return encode_chart(chart, fields)
+
+    @staticmethod
+    def single(encoded, fields):
+        return chart_response(encoded)
+
+    @staticmethod
+    def batch(encoded_charts, fields):
+        return charts_response(encoded_charts)
+
+
+class PackedFormat:
+    name = 'packed'
+    content_type = PACKED_CONTENT_TYPE
+
+    @staticmethod
+    def chart(chart, fields):
+        return pack_chart(chart, needs_lunar(fields))
+
+    @staticmethod
+    def single(encoded, fields):
+        return pack_header(needs_lunar(fields)) + encoded
+
+    @staticmethod
+    def batch(encoded_charts, fields):
+        return pack_header(needs_lunar(fields)) + b''.join(encoded_charts)
+
+
+def _msgpack_array_header(length):
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length < 0x10000:
+        return b'\xdc' + struct.pack('>H', length)
+    return b'\xdd' + struct.pack('>I', length)
+
+
+class MsgpackFormat:
+    name = 'msgpack'
+    content_type = 'application/x-msgpack'
+
+    @staticmethod
+    def chart(chart, fields):
+        result = chart.to_dict(fields)
+        result.update(SOURCE)
+        return msgpack.packb(result)
+
+    # 外层只有一个键，直接拼接已编码的命盘，避免再次编码
+    @staticmethod
+    def single(encoded, fields):
+        return b'\x81' + msgpack.packb('chart') + encoded
+
+    @staticmethod
+    def batch(encoded_charts, fields):
+        return b'\x81' + msgpack.packb('charts') + _msgpack_array_header(len(encoded_charts)) + b''.join(encoded_charts)
+
+
+# 媒体类型 -> 格式
+FORMATS = {
+    JsonFormat.content_type: JsonFormat,
+    PackedFormat.content_type: PackedFormat,
+}
+if msgpack is not None:
+    FORMATS[MsgpackFormat.content_type] = MsgpackFormat
+    FORMATS['application/msgpack'] = MsgpackFormat
+
+
+def negotiate(accept):
+    """按Accept头（支持q值）选择响应格式，无可用格式时返回JSON"""
+    if not accept:
+        return JsonFormat
+    best, best_q = JsonFormat, 0.0
+    for item in accept.split(','):
+        media_type, *params = (part.strip() for part in item.split(';'))
+        response_format = FORMATS.get(media_type.lower())
+        if response_format is None:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = response_format, q
+    return best
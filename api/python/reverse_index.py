@@ -0,0 +1,258 @@
+"""八字反查：由四柱找出对应的出生时间段
+
+年柱、月柱在交节时切换，日柱按公历日六十甲子循环，时柱由日干与时辰推出。
+因此只需以(年柱, 月柱, 日柱)为键，记录每一天（逢交节的日子拆为交节前后两段）；
+查询时柱时再按日干算出该时柱所在的时辰，与这些时段求交集。
+
+索引以北京时间计，对应经度120°（真太阳时即北京时间）、子时规则为civil（此时与split相同）
+的排盘结果：calculate_bazi(dt, 120) 的四柱与查询的四柱相同。其他经度需按真太阳时自行换算。
+
+文件布局（小端）：
+
+    头部  4s 魔数  H 版本  h 起始年  h 结束年  I 条数
+    键    I[条数]  (年柱 * 60 + 月柱) * 60 + 日柱，升序
+    日    i[条数]  公历日距1900-01-01的天数
+    起    H[条数]  该段在当天的起始分钟
+    止    H[条数]  该段在当天的结束分钟（不含）
+
+打开时用mmap映射，键数组直接二分查找，不读入内存。
+默认范围的索引文件reverse_index.bin随代码提交（与jieqi_1800_2200.bin相同），Serverless冷启动时直接映射；
+修改文件格式或建索引的逻辑后须用下面的build命令重新生成。
+
+    python reverse_index.py build --start 1900 --end 2100
+    python reverse_index.py find 庚午 辛巳 壬午 甲辰
+"""
+import argparse
+import datetime
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_core import DIZHI_INDEX, TIANGAN_INDEX, pillar_index
+from bazi_with_sxtwl import get_day_gz_index, get_hour_gz_index
+from jieqi import EPOCH, get_jie_table
+
+DEFAULT_START_YEAR = int(os.environ.get('BAZI_REVERSE_START_YEAR', 1900))
+DEFAULT_END_YEAR = int(os.environ.get('BAZI_REVERSE_END_YEAR', 2100))
+
+# 索引文件，不存在时在内存中现建
+DEFAULT_INDEX_PATH = os.environ.get(
+    'BAZI_REVERSE_INDEX',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reverse_index.bin')
+)
+
+_FILE_MAGIC = b'BZRI'
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct('<4sHhhI')
+
+_EPOCH_DATE = EPOCH.date()
+_EPOCH_DAY_GZ = get_day_gz_index(_EPOCH_DATE)
+_MINUTES_PER_DAY = 1440
+
+# 各时辰在一天中的起止分钟：子时分为早子时（0-1点）与晚子时（23-24点）
+_EARLY_ZI = (0, 60)
+_LATE_ZI = (23 * 60, _MINUTES_PER_DAY)
+
+
+def make_key(year, month, day):
+    return (year * 60 + month) * 60 + day
+
+
+def _pillar(value):
+    """干支名（如"甲子"）或六十甲子序号转换为序号"""
+    if isinstance(value, str):
+        if len(value) != 2 or value[0] not in TIANGAN_INDEX or value[1] not in DIZHI_INDEX:
+            raise ValueError(f'无效的干支: {value}')
+        stem, branch = TIANGAN_INDEX[value[0]], DIZHI_INDEX[value[1]]
+        if stem % 2 != branch % 2:
+            raise ValueError(f'无效的干支: {value}')
+        return pillar_index(stem, branch)
+    if not 0 <= value < 60:
+        raise ValueError(f'无效的干支序号: {value}')
+    return value
+
+
+def hour_ranges(day_gz, hour_gz):
+    """日柱为day_gz时，时柱hour_gz在一天中的分钟区间列表（时干与日干不符时为空）"""
+    branch = hour_gz % 12
+    if branch == 0:
+        ranges = []
+        if get_hour_gz_index(day_gz, 0) == hour_gz:
+            ranges.append(_EARLY_ZI)
+        if get_hour_gz_index(day_gz, 23) == hour_gz:
+            ranges.append(_LATE_ZI)
+        return ranges
+    if get_hour_gz_index(day_gz, branch * 2) != hour_gz:
+        return []
+    return [((branch * 2 - 1) * 60, (branch * 2 + 1) * 60)]
+
+
+class ReverseIndex:
+    """(年柱, 月柱, 日柱) -> 当天时段的有序索引"""
+
+    __slots__ = ('start_year', 'end_year', 'keys', 'days', 'starts', 'ends', '_mmap')
+
+    def __init__(self, start_year, end_year, keys, days, starts, ends, mapped=None):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.keys = keys
+        self.days = days
+        self.starts = starts
+        self.ends = ends
+        self._mmap = mapped
+
+    @classmethod
+    def build(cls, start_year=DEFAULT_START_YEAR, end_year=DEFAULT_END_YEAR):
+        """由节气表与六十日循环建索引，不调用sxtwl"""
+        table = get_jie_table()
+        if not table.covers(start_year, end_year):
+            raise ValueError(f'节气表不包含{start_year}-{end_year}年')
+
+        entries = []
+        day = (datetime.date(start_year, 1, 1) - _EPOCH_DATE).days
+        last_day = (datetime.date(end_year, 12, 31) - _EPOCH_DATE).days
+        jie_minutes = table.minutes
+        # 节气表自其起始年的立春开始：之前的时段定不了年柱、月柱，不收入索引
+        first_minute, last_minute = jie_minutes[0], jie_minutes[-1]
+        while day <= last_day:
+            day_start = day * _MINUTES_PER_DAY
+            day_gz = (day + _EPOCH_DAY_GZ) % 60
+            # 当天交节时按交节时刻分段
+            start = max(day_start, first_minute)
+            day_end = min(day_start + _MINUTES_PER_DAY, last_minute)
+            while start < day_end:
+                end = min(day_end, jie_minutes[table.locate(start) + 1])
+                year_gz, month_gz = table.pillar_indices(start)
+                entries.append((make_key(year_gz, month_gz, day_gz), day, start - day_start, end - day_start))
+                start = end
+            day += 1
+
+        entries.sort()
+        return cls(start_year, end_year,
+                   array('I', (entry[0] for entry in entries)),
+                   array('i', (entry[1] for entry in entries)),
+                   array('H', (entry[2] for entry in entries)),
+                   array('H', (entry[3] for entry in entries)))
+
+    def save(self, path):
+        columns = [array(column.typecode, column) for column in (self.keys, self.days, self.starts, self.ends)]
+        if sys.byteorder == 'big':
+            for column in columns:
+                column.byteswap()
+        with open(path, 'wb') as f:
+            f.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, self.start_year, self.end_year, len(self.keys)))
+            for column in columns:
+                f.write(column.tobytes())
+
+    @classmethod
+    def open(cls, path):
+        """以mmap打开save()写出的索引"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, start_year, end_year, count = _FILE_HEADER.unpack_from(mapped)
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            raise ValueError(f'无法识别的反查索引文件: {path}')
+        if len(mapped) != _FILE_HEADER.size + count * 12:
+            raise ValueError(f'反查索引文件长度不符: {path}')
+
+        view = memoryview(mapped)
+        offset = _FILE_HEADER.size
+        columns = []
+        for typecode, size in (('I', 4), ('i', 4), ('H', 2), ('H', 2)):
+            column = view[offset:offset + count * size]
+            if sys.byteorder == 'big':
+                # 大端机器无法直接映射，读入内存后转换字节序
+                column = array(typecode, column.tobytes())
+                column.byteswap()
+            else:
+                column = column.cast(typecode)
+            columns.append(column)
+            offset += count * size
+        return cls(start_year, end_year, *columns, mapped=mapped)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, year, month, day, hour=None):
+        """返回四柱（干支名或序号）对应的时段列表[(起, 止)]，均为北京时间datetime，止不含
+
+        hour为None时返回年、月、日三柱相符的时段
+        """
+        year, month, day = _pillar(year), _pillar(month), _pillar(day)
+        key = make_key(year, month, day)
+        first = bisect_left(self.keys, key)
+        last = bisect_right(self.keys, key, first)
+        if hour is None:
+            ranges = [(0, _MINUTES_PER_DAY)]
+        else:
+            ranges = hour_ranges(day, _pillar(hour))
+
+        windows = []
+        for i in range(first, last):
+            day_start = EPOCH + datetime.timedelta(days=self.days[i])
+            segment_start, segment_end = self.starts[i], self.ends[i]
+            for range_start, range_end in ranges:
+                start, end = max(segment_start, range_start), min(segment_end, range_end)
+                if start < end:
+                    windows.append((day_start + datetime.timedelta(minutes=start),
+                                    day_start + datetime.timedelta(minutes=end)))
+        windows.sort()
+        return windows
+
+    def close(self):
+        if self._mmap is not None:
+            self.keys = self.days = self.starts = self.ends = None
+            self._mmap.close()
+            self._mmap = None
+
+
+@lru_cache(maxsize=None)
+def get_reverse_index(path=DEFAULT_INDEX_PATH):
+    """获取反查索引：文件存在时mmap打开，否则按默认范围在内存中建立"""
+    if os.path.exists(path):
+        return ReverseIndex.open(path)
+    return ReverseIndex.build()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='八字反查索引')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='建立索引文件')
+    build.add_argument('--start', type=int, default=DEFAULT_START_YEAR)
+    build.add_argument('--end', type=int, default=DEFAULT_END_YEAR)
+    build.add_argument('--out', default=DEFAULT_INDEX_PATH)
+    find = commands.add_parser('find', help='查询四柱对应的时段')
+    find.add_argument('pillars', nargs='+', metavar='干支', help='年柱 月柱 日柱 [时柱]')
+    find.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        index = ReverseIndex.build(args.start, args.end)
+        index.save(args.out)
+        print(f'已写入 {args.out}：{len(index)}条，{os.path.getsize(args.out)}字节，'
+              f'耗时{time.perf_counter() - started:.2f}秒')
+        return
+
+    if len(args.pillars) not in (3, 4):
+        parser.error('需要年柱、月柱、日柱，可再加时柱')
+    index = get_reverse_index(args.index)
+    started = time.perf_counter()
+    windows = index.find(*args.pillars)
+    elapsed = time.perf_counter() - started
+    for start, end in windows:
+        print(f'{start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}')
+    print(f'共{len(windows)}段，查询耗时{elapsed * 1e3:.2f}毫秒', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""接口响应的JSON序列化
+
+命盘的各个字段只取决于四柱下标、日干与日记录，取值来自有限的汉字集合。
+fragments后端在导入时把这些取值（六十甲子、天干地支、藏干、纳音、各日干下的十神等）
+预先编码为UTF-8字节片段，序列化Chart时按下标取片段拼接，不经过中间字典，
+输出与 json.dumps(chart.to_dict(fields), ensure_ascii=False).encode('utf-8') 逐字节相同。
+
+可选的orjson后端（BAZI_JSON_BACKEND=orjson）输出无空格的紧凑JSON，解析结果相同；
+它需要先生成命盘字典，实测序列化命盘比fragments慢，因此默认（auto）使用fragments，
+orjson只在希望响应体更小时启用（另行pip install orjson，未列入requirements.txt）。
+
+fragments与json.dumps逐字节相同由check()保证：修改命盘字段或片段后须运行下面的命令，
+vercel-build.sh在构建时也会运行（不一致时构建失败）。它同时核对大运流年（encode_timeline），
+并比较各后端的耗时：
+
+    python serializer.py --check 2000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_core import CHART_FIELDS, DEFAULT_FIELDS, DIZHI, PILLARS, RELATIVE_TABLE, TIANGAN, WUXING
+from dayun import DA_YUN_KEYS, LIU_NIAN_KEYS
+from interactions import PILLAR_KEYS, chart_interactions, interaction_to_dict
+from shensha import mask_names, shen_sha_masks
+from wuxing_strength import SEASON_STATES, wu_xing_strength
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖
+    orjson = None
+
+# 命盘附带的固定字段
+SOURCE = {'source': 'sxtwl'}
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+# 字段名片段，如 b'"naYin": '
+_KEYS = {field: _encode(field) + b': ' for field in CHART_FIELDS}
+
+# 按下标取值的片段
+_NAMES = tuple(_encode(pillar.name) for pillar in PILLARS)
+_NAYIN = tuple(_encode(pillar.na_yin) for pillar in PILLARS)
+_CANG_GAN = tuple(_encode(list(pillar.cang_gan)) for pillar in PILLARS)
+_GAN = tuple(_encode(gan) for gan in TIANGAN)
+_ZHI = tuple(_encode(zhi) for zhi in DIZHI)
+# _GAN_SHEN[日干][干支序号]、_ZHI_SHEN[日干][干支序号]
+_GAN_SHEN = tuple(tuple(_encode(rel.gan_shen) for rel in row) for row in RELATIVE_TABLE)
+_ZHI_SHEN = tuple(tuple(_encode(list(rel.zhi_shen)) for rel in row) for row in RELATIVE_TABLE)
+_DAY_MASTER = _encode("日主")
+
+# relations中的原始UTF-8（不含引号）
+_GAN_WUXING_RAW = tuple(PILLARS[stem].gan_wuxing.encode('utf-8') for stem in range(10))
+_ZHI_RAW = tuple(zhi.encode('utf-8') for zhi in DIZHI)
+
+_BY_PILLAR = b'{"year": %s, "month": %s, "day": %s, "hour": %s}'
+_RELATIONS = '{"tianGan": "%s→%s→%s→%s", "diZhi": "%s→%s→%s→%s"}'.encode('utf-8')
+_LUNAR_DATE = b'{"year": %d, "month": %d, "day": %d, "leap": %s}'
+_TRUE_SOLAR_TIME = b'"%d-%02d-%02d %02d:%02d"'
+
+# 神煞位掩码 -> 名称列表片段
+_SHEN_SHA_LISTS = {}
+
+
+def _shen_sha_list(mask):
+    fragment = _SHEN_SHA_LISTS.get(mask)
+    if fragment is None:
+        fragment = _SHEN_SHA_LISTS[mask] = _encode(list(mask_names(mask)))
+    return fragment
+
+
+def _gan_shen(chart):
+    row = _GAN_SHEN[chart.day.stem]
+    return _BY_PILLAR % (row[chart.year.index], row[chart.month.index], _DAY_MASTER, row[chart.hour.index])
+
+
+def _zhi_shen(chart):
+    row = _ZHI_SHEN[chart.day.stem]
+    return _BY_PILLAR % tuple(row[pillar.index] for pillar in chart.pillars)
+
+
+def _shen_sha(chart):
+    return _BY_PILLAR % tuple(_shen_sha_list(mask) for mask in shen_sha_masks(*chart.pillars))
+
+
+def _relations(chart):
+    pillars = chart.pillars
+    return _RELATIONS % (tuple(_GAN_WUXING_RAW[pillar.stem] for pillar in pillars)
+                         + tuple(_ZHI_RAW[pillar.branch] for pillar in pillars))
+
+
+def _lunar_date(chart):
+    record = chart.record
+    return _LUNAR_DATE % (record.lunar_year, record.lunar_month, record.lunar_day,
+                          b'true' if record.lunar_leap else b'false')
+
+
+def _true_solar_time(chart):
+    true_dt = chart.true_dt
+    return _TRUE_SOLAR_TIME % (true_dt.year, true_dt.month, true_dt.day, true_dt.hour, true_dt.minute)
+
+
+# 作用关系：(Interaction, 柱名) -> 片段
+_INTERACTIONS = {}
+_INTERACTIONS_TEMPLATE = b'{"tianGan": [%s], "diZhi": [%s]}'
+
+
+def _interaction(interaction, keys=PILLAR_KEYS):
+    fragment = _INTERACTIONS.get((interaction, keys))
+    if fragment is None:
+        fragment = _INTERACTIONS[interaction, keys] = _encode(interaction_to_dict(interaction, keys))
+    return fragment
+
+
+def _interaction_lists(stem_interactions, branch_interactions, keys=PILLAR_KEYS):
+    return _INTERACTIONS_TEMPLATE % (b', '.join(_interaction(interaction, keys) for interaction in stem_interactions),
+                                     b', '.join(_interaction(interaction, keys) for interaction in branch_interactions))
+
+
+def _interactions(chart):
+    return _interaction_lists(*chart_interactions(chart.year, chart.month, chart.day, chart.hour))
+
+
+# 五行强弱：五行得分按WUXING顺序，月令状态、日主五行、身强身弱按下标取片段
+_WU_XING_STRENGTH = ('{"scores": {"木": %d, "火": %d, "土": %d, "金": %d, "水": %d}, "season": %s, '
+                     '"dayMaster": %s, "supportRatio": %s, "strength": %s, "yongShen": %s}').encode('utf-8')
+_SEASON = tuple(_encode(dict(zip(WUXING, states))) for states in SEASON_STATES)
+_ELEMENT = tuple(_encode(element) for element in WUXING)
+_STRENGTH = {True: _encode("身强"), False: _encode("身弱")}
+
+
+def _wu_xing_strength(chart):
+    strength = wu_xing_strength(chart.year, chart.month, chart.day, chart.hour)
+    yong_shen = b'[' + b', '.join(_ELEMENT[element] for element in strength.yong_shen) + b']'
+    return _WU_XING_STRENGTH % (strength.scores + (
+        _SEASON[strength.month_branch], _ELEMENT[strength.day_element], repr(strength.support_ratio).encode('ascii'),
+        _STRENGTH[strength.strong], yong_shen))
+
+
+# 大运、流年条目：_TIMELINE_INFO[日干][干支序号]为干支、十神、藏干十神、纳音四个键值
+_TIMELINE_INFO = tuple(
+    tuple(b'"ganZhi": %s, "ganShen": %s, "zhiShen": %s, "naYin": %s'
+          % (_NAMES[i], _GAN_SHEN[day_stem][i], _ZHI_SHEN[day_stem][i], _NAYIN[i]) for i in range(60))
+    for day_stem in range(10)
+)
+_DA_YUN = b'{%s, "shenSha": %s, "step": %d, "startYear": %d, "endYear": %d%s}'
+_LIU_NIAN = b'{%s, "shenSha": %s, "year": %d, "age": %d, "daYun": %s%s}'
+_TIMELINE = (b'{"direction": %s, "startAge": {"years": %d, "months": %d, "days": %d}, '
+             b'"startDate": "%s", "daYun": [%s], "liuNian": [%s]}')
+_DIRECTIONS = {True: _encode("顺"), False: _encode("逆")}
+
+
+def _timeline_interactions(timeline, keys):
+    """干支序号 -> 该柱作用关系的键值片段（按需计算）"""
+    fragments = {}
+
+    def fragment(index):
+        value = fragments.get(index)
+        if value is None:
+            value = fragments[index] = b', "interactions": ' + _interaction_lists(*timeline.interactions(index), keys)
+        return value
+    return fragment
+
+
+def _no_interactions(index):
+    return b''
+
+
+def _encode_timeline(timeline, years, count, interactions=False):
+    info = _TIMELINE_INFO[timeline.chart.day.stem]
+    shen_sha = tuple(_shen_sha_list(mask) for mask in timeline.shen_sha_masks)
+    da_yun_extra = _timeline_interactions(timeline, DA_YUN_KEYS) if interactions else _no_interactions
+    liu_nian_extra = _timeline_interactions(timeline, LIU_NIAN_KEYS) if interactions else _no_interactions
+    da_yun = [
+        _DA_YUN % (info[item.pillar.index], shen_sha[item.pillar.branch], item.step, item.start_year, item.end_year,
+                   da_yun_extra(item.pillar.index))
+        for item in timeline.da_yun(count)
+    ]
+    names = (b'null',) + tuple(_NAMES[timeline.da_yun_pillar(step).index] for step in range(1, count + 1))
+    liu_nian = [
+        _LIU_NIAN % (info[index], shen_sha[index % 12], year, age, names[step], liu_nian_extra(index))
+        for year, age, index, step in timeline.liu_nian_steps(years, count)
+    ]
+    start_age = timeline.start_age
+    return _TIMELINE % (_DIRECTIONS[timeline.forward], start_age.years, start_age.months, start_age.days,
+                        timeline.start_date.isoformat().encode('ascii'), b', '.join(da_yun), b', '.join(liu_nian))
+
+
+# 各字段的编码函数，与bazi_core.CHART_SECTIONS一一对应
+_ENCODERS = {
+    "年柱": lambda chart: _NAMES[chart.year.index],
+    "月柱": lambda chart: _NAMES[chart.month.index],
+    "日柱": lambda chart: _NAMES[chart.day.index],
+    "时柱": lambda chart: _NAMES[chart.hour.index],
+    "ganShen": _gan_shen,
+    "tianGan": lambda chart: _BY_PILLAR % tuple(_GAN[pillar.stem] for pillar in chart.pillars),
+    "diZhi": lambda chart: _BY_PILLAR % tuple(_ZHI[pillar.branch] for pillar in chart.pillars),
+    "cangGan": lambda chart: _BY_PILLAR % tuple(_CANG_GAN[pillar.index] for pillar in chart.pillars),
+    "zhiShen": _zhi_shen,
+    "naYin": lambda chart: _BY_PILLAR % tuple(_NAYIN[pillar.index] for pillar in chart.pillars),
+    "shenSha": _shen_sha,
+    "relations": _relations,
+    "interactions": _interactions,
+    "wuXingStrength": _wu_xing_strength,
+    "lunarDate": _lunar_date,
+    "zodiac": lambda chart: _ZHI[(chart.record.lunar_year - 4) % 12],
+    "真太阳时": _true_solar_time,
+    "时支": lambda chart: _ZHI[chart.true_dt.hour // 2],
+}
+
+_SOURCE_ITEMS = b', '.join(_encode(key) + b': ' + _encode(value) for key, value in SOURCE.items())
+
+
+class FragmentBackend:
+    """预编码片段拼接，与json.dumps(ensure_ascii=False)逐字节相同"""
+
+    name = 'fragments'
+
+    @staticmethod
+    def dumps(data):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def chart(chart, fields=DEFAULT_FIELDS):
+        parts = [_KEYS[field] + _ENCODERS[field](chart) for field in fields]
+        parts.append(_SOURCE_ITEMS)
+        return b'{' + b', '.join(parts) + b'}'
+
+    timeline = staticmethod(_encode_timeline)
+
+
+class OrjsonBackend:
+    """orjson，输出紧凑JSON"""
+
+    name = 'orjson'
+
+    @staticmethod
+    def dumps(data):
+        return orjson.dumps(data)
+
+    @staticmethod
+    def chart(chart, fields=DEFAULT_FIELDS):
+        result = chart.to_dict(fields)
+        result.update(SOURCE)
+        return orjson.dumps(result)
+
+    @staticmethod
+    def timeline(timeline, years, count, interactions=False):
+        return orjson.dumps(timeline.to_dict(years, count, interactions))
+
+
+BACKENDS = {'fragments': FragmentBackend, 'orjson': OrjsonBackend}
+
+
+def get_backend(name=None):
+    """按名称（默认取BAZI_JSON_BACKEND：auto、fragments或orjson）选择后端"""
+    name = name or os.environ.get('BAZI_JSON_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'fragments'
+    if name == 'orjson' and orjson is None:
+        raise ValueError('BAZI_JSON_BACKEND=orjson，但未安装orjson')
+    if name not in BACKENDS:
+        raise ValueError(f'未知的JSON后端: {name}')
+    return BACKENDS[name]
+
+
+backend = get_backend()
+
+
+def dumps(data):
+    """序列化任意响应字典为UTF-8字节"""
+    return backend.dumps(data)
+
+
+def encode_chart(chart, fields=DEFAULT_FIELDS):
+    """序列化Chart为 {...命盘字段, "source": "sxtwl"}，fields须已经过normalize_fields"""
+    return backend.chart(chart, fields)
+
+
+def encode_timeline(timeline, years=100, count=10, interactions=False):
+    """序列化dayun.Timeline，与json.dumps(timeline.to_dict(years, count, interactions))相同"""
+    return backend.timeline(timeline, years, count, interactions)
+
+
+def chart_response(encoded_chart):
+    """单个命盘响应 {"chart": ...}"""
+    return b'{"chart": ' + encoded_chart + b'}'
+
+
+def charts_response(encoded_charts):
+    """批量响应 {"charts": [...]}"""
+    return b'{"charts": [' + b', '.join(encoded_charts) + b']}'
+
+
+def check(count, seed=0):
+    """与json.dumps逐字节比对count个随机命盘，并输出各序列化方式的耗时"""
+    from bazi_with_sxtwl import build_chart
+
+    from dayun import build_timeline
+
+    rng = random.Random(seed)
+    cases = []
+    timelines = []
+    for _ in range(count):
+        # 含节气表范围之外的年份
+        dt = datetime.datetime(rng.randint(1601, 2399), rng.randint(1, 12), rng.randint(1, 28),
+                               rng.randint(0, 23), rng.randint(0, 59))
+        longitude = rng.uniform(73, 135)
+        chart = build_chart(dt, longitude)
+        fields = DEFAULT_FIELDS
+        if rng.random() < 0.3:
+            fields = tuple(field for field in CHART_FIELDS if rng.random() < 0.5)
+        cases.append((chart, fields))
+        if 1801 <= dt.year <= 2150 and len(timelines) < count // 10:
+            timelines.append(build_timeline(dt, longitude, rng.choice(('male', 'female')), chart=chart))
+
+    for chart, fields in cases:
+        expected = _encode({**chart.to_dict(fields), **SOURCE})
+        actual = FragmentBackend.chart(chart, fields)
+        if actual != expected:
+            raise AssertionError(f'输出不一致:\n{expected.decode()}\n{actual.decode()}')
+        if orjson is not None and json.loads(OrjsonBackend.chart(chart, fields)) != json.loads(expected):
+            raise AssertionError(f'orjson输出解析结果不一致:\n{expected.decode()}')
+    for number, timeline in enumerate(timelines):
+        interactions = number % 2 == 1
+        expected = _encode(timeline.to_dict(interactions=interactions))
+        actual = FragmentBackend.timeline(timeline, 100, 10, interactions)
+        if actual != expected:
+            raise AssertionError(f'大运流年输出不一致:\n{expected.decode()}\n{actual.decode()}')
+    print(f'{count}个命盘、{len(timelines)}条大运流年与json.dumps逐字节一致')
+
+    # 先加载全部日记录，以下只比较序列化本身
+    for chart, _ in cases:
+        chart.record
+    timings = [('json.dumps', lambda chart, fields: _encode({**chart.to_dict(fields), **SOURCE}))]
+    timings += [(name, cls.chart) for name, cls in BACKENDS.items() if name != 'orjson' or orjson is not None]
+    for name, encode in timings:
+        started = time.perf_counter()
+        for chart, _ in cases:
+            encode(chart, CHART_FIELDS)
+        elapsed = time.perf_counter() - started
+        print(f'{name:<10} {elapsed / count * 1e6:6.1f} 微秒/盘')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='校验命盘序列化输出与json.dumps一致')
+    parser.add_argument('--check', type=int, metavar='COUNT', default=1000, help='随机命盘数量')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    check(args.check, args.seed)
+
+
+if __name__ == '__main__':
+    main()
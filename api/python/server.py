@@ -0,0 +1,100 @@
+"""八字计算HTTP服务（非Vercel环境使用）
+
+复用handler.py中的路由与处理逻辑，在其上提供：
+    - HTTP/1.1长连接（空闲超过--keep-alive秒自动断开）
+    - 每个连接一个守护线程；同时处理的请求数不超过--workers，
+      空闲的长连接不占名额，不会让新连接排队等待
+    - 请求体大小限制（--max-body，超出返回413）
+    - 收到SIGTERM/SIGINT后停止接收新连接，等待处理中的请求完成再退出（空闲的长连接直接断开）
+
+    python server.py --port 8000 --workers 32
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from handler import handler
+
+
+class ChartRequestHandler(handler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与响应体分两次写出，长连接上需关闭Nagle算法以免等待ACK
+    disable_nagle_algorithm = True
+    # 长连接空闲超时（秒），由serve()按参数覆盖
+    timeout = 15
+
+    # 只在处理请求期间占用名额，等待下一个请求的长连接不占用
+    def do_POST(self):
+        with self.server.request_slots:
+            super().do_POST()
+
+    def do_GET(self):
+        with self.server.request_slots:
+            super().do_GET()
+
+
+class ChartHTTPServer(ThreadingHTTPServer):
+    """每个连接一个守护线程，同时处理的请求数由request_slots限制"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.request_slots = threading.BoundedSemaphore(workers)
+
+    def server_close(self):
+        """关闭监听端口，并等待处理中的请求完成"""
+        super().server_close()
+        for _ in range(self.workers):
+            self.request_slots.acquire()
+
+
+def serve(host='0.0.0.0', port=8000, workers=None, max_body_bytes=None, keep_alive=15.0):
+    """启动服务并阻塞，直到收到SIGTERM/SIGINT"""
+    workers = workers or min(64, (os.cpu_count() or 1) * 8)
+    handler_class = type('ConfiguredChartRequestHandler', (ChartRequestHandler,), {
+        'timeout': keep_alive,
+        'max_body_bytes': max_body_bytes or ChartRequestHandler.max_body_bytes,
+    })
+    server = ChartHTTPServer((host, port), handler_class, workers)
+
+    def stop(signum, frame):
+        # shutdown()会等待serve_forever退出，必须在其他线程中调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f'八字服务已启动: http://{host}:{port} (workers={workers})', flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    print('八字服务已停止', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='八字计算HTTP服务')
+    parser.add_argument('--host', default=os.environ.get('BAZI_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('BAZI_HTTP_WORKERS', 0)) or None,
+                        help='同时处理的请求数上限，默认min(64, CPU核数*8)')
+    parser.add_argument('--max-body', type=int, default=None,
+                        help='请求体大小上限（字节），默认取BAZI_MAX_BODY_BYTES或1MiB')
+    parser.add_argument('--keep-alive', type=float, default=15.0, help='长连接空闲超时（秒）')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.max_body, args.keep_alive)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""神煞规则引擎
+
+神煞以数据声明（SHENSHA_RULES），导入时编译为按下标访问的位掩码表：
+每条规则占一位，依据日柱（日干、日支、本柱地支）的规则归入日柱表，依据年柱
+（年干、年支）的规则归入年柱表。计算一张命盘时每柱只需两次查表再按位或，
+与规则数量无关；掩码到名称列表的转换按掩码缓存。
+
+新增神煞只需在SHENSHA_RULES中追加一行。
+"""
+from bazi_core import DIZHI_INDEX, TIANGAN_INDEX
+
+PILLAR_KEYS = ('year', 'month', 'day', 'hour')
+
+# 神煞表（简化，仅包含部分常见神煞）
+SHENSHAS = {
+    "贵人": {
+        "甲": ["丑", "未"], "乙": ["子", "申"],
+        "丙": ["亥", "酉"], "丁": ["亥", "酉"],
+        "戊": ["丑", "未"], "己": ["子", "申"],
+        "庚": ["丑", "未"], "辛": ["子", "申"],
+        "壬": ["卯", "巳"], "癸": ["卯", "巳"]
+    },
+    "天乙贵人": {
+        "甲": ["巳", "申"], "乙": ["午", "酉"],
+        "丙": ["申", "亥"], "丁": ["酉", "子"],
+        "戊": ["申", "亥"], "己": ["酉", "子"],
+        "庚": ["亥", "寅"], "辛": ["子", "卯"],
+        "壬": ["寅", "巳"], "癸": ["卯", "午"]
+    },
+    "文昌": {
+        "甲": "巳", "乙": "午", "丙": "申", "丁": "酉",
+        "戊": "申", "己": "酉", "庚": "亥", "辛": "子",
+        "壬": "寅", "癸": "卯"
+    },
+    "华盖": {
+        "子": "未", "丑": "午", "寅": "巳", "卯": "辰",
+        "辰": "卯", "巳": "寅", "午": "丑", "未": "子",
+        "申": "亥", "酉": "戌", "戌": "酉", "亥": "申"
+    },
+    "桃花": {
+        "子": "酉", "丑": "辰", "寅": "亥", "卯": "午",
+        "辰": "丑", "巳": "申", "午": "卯", "未": "戌",
+        "申": "巳", "酉": "子", "戌": "未", "亥": "寅"
+    },
+    "驿马": {
+        "子": "寅", "丑": "亥", "寅": "申", "卯": "巳",
+        "辰": "寅", "巳": "亥", "午": "申", "未": "巳",
+        "申": "寅", "酉": "亥", "戌": "申", "亥": "巳"
+    }
+}
+
+# 规则依据
+DAY_STEM = 'day_stem'          # 以日干查
+YEAR_STEM = 'year_stem'        # 以年干查
+YEAR_BRANCH = 'year_branch'    # 以年支查
+DAY_BRANCH = 'day_branch'      # 以日支查
+PILLAR_BRANCH = 'pillar_branch'  # 以本柱地支查
+
+BASES = (DAY_STEM, YEAR_STEM, YEAR_BRANCH, DAY_BRANCH, PILLAR_BRANCH)
+
+ALL_PILLARS = PILLAR_KEYS
+NON_DAY_PILLARS = ('year', 'month', 'hour')
+
+# (名称, 依据, {依据的干或支: 目标地支或地支列表}, 适用的柱)，输出顺序即声明顺序
+SHENSHA_RULES = (
+    ("贵人", DAY_STEM, SHENSHAS["贵人"], NON_DAY_PILLARS),
+    ("天乙贵人", DAY_STEM, SHENSHAS["天乙贵人"], NON_DAY_PILLARS),
+    ("文昌", DAY_STEM, SHENSHAS["文昌"], NON_DAY_PILLARS),
+    ("华盖", PILLAR_BRANCH, SHENSHAS["华盖"], ALL_PILLARS),
+    ("桃花", PILLAR_BRANCH, SHENSHAS["桃花"], ALL_PILLARS),
+    ("驿马", PILLAR_BRANCH, SHENSHAS["驿马"], ALL_PILLARS),
+)
+
+
+def _basis_index(basis, key):
+    if basis in (DAY_STEM, YEAR_STEM):
+        return TIANGAN_INDEX[key]
+    return DIZHI_INDEX[key]
+
+
+def compile_rules(rules):
+    """编译规则，返回(名称元组, 日柱掩码表, 年柱掩码表)
+
+    日柱掩码表合并了日干、日支与本柱地支依据的规则，年柱掩码表合并了年干、年支依据的规则，
+    两者的下标均为[柱位][依据柱的干支序号 * 12 + 本柱地支]。
+    """
+    names = tuple(rule[0] for rule in rules)
+    day_masks = [[0] * (60 * 12) for _ in PILLAR_KEYS]
+    year_masks = [[0] * (60 * 12) for _ in PILLAR_KEYS]
+
+    for bit, (name, basis, mapping, pillars) in enumerate(rules):
+        if basis not in BASES:
+            raise ValueError(f'神煞{name}的依据无效: {basis}')
+        positions = [i for i, key in enumerate(PILLAR_KEYS) if key in pillars]
+        table = year_masks if basis in (YEAR_STEM, YEAR_BRANCH) else day_masks
+        for key, targets in mapping.items():
+            if isinstance(targets, str):
+                targets = [targets]
+            key_index = _basis_index(basis, key)
+            for target in targets:
+                branch = DIZHI_INDEX[target]
+                # 依据即本柱地支：本柱地支既是key又是目标时才成立
+                if basis == PILLAR_BRANCH and branch != key_index:
+                    continue
+                for gz in range(60):
+                    if basis in (DAY_STEM, YEAR_STEM) and gz % 10 != key_index:
+                        continue
+                    if basis in (DAY_BRANCH, YEAR_BRANCH) and gz % 12 != key_index:
+                        continue
+                    for position in positions:
+                        table[position][gz * 12 + branch] |= 1 << bit
+
+    return names, tuple(map(tuple, day_masks)), tuple(map(tuple, year_masks))
+
+
+SHENSHA_NAMES, DAY_MASKS, YEAR_MASKS = compile_rules(SHENSHA_RULES)
+
+_MASK_NAMES = {0: ()}
+
+
+def mask_names(mask):
+    """位掩码转换为神煞名称元组（按声明顺序）"""
+    names = _MASK_NAMES.get(mask)
+    if names is None:
+        names = tuple(name for bit, name in enumerate(SHENSHA_NAMES) if mask >> bit & 1)
+        _MASK_NAMES[mask] = names
+    return names
+
+
+def shen_sha_masks(year, month, day, hour):
+    """计算四柱各自的神煞位掩码，参数为bazi_core.Pillar"""
+    day_base = day.index * 12
+    year_base = year.index * 12
+    return [
+        DAY_MASKS[position][day_base + pillar.branch] | YEAR_MASKS[position][year_base + pillar.branch]
+        for position, pillar in enumerate((year, month, day, hour))
+    ]
+
+
+# 大运、流年等命盘之外的柱适用非日柱的规则，与月柱相同
+EXTERNAL_POSITION = PILLAR_KEYS.index('month')
+
+
+def external_pillar_mask(year, day, branch):
+    """命盘之外的柱（大运、流年）相对命盘年柱、日柱的神煞位掩码，branch为该柱地支下标"""
+    return (DAY_MASKS[EXTERNAL_POSITION][day.index * 12 + branch]
+            | YEAR_MASKS[EXTERNAL_POSITION][year.index * 12 + branch])
+
+
+def shen_sha_for_pillars(year, month, day, hour):
+    """返回 {"year": [...], "month": [...], "day": [...], "hour": [...]}"""
+    y, m, d, h = shen_sha_masks(year, month, day, hour)
+    return {
+        "year": list(mask_names(y)),
+        "month": list(mask_names(m)),
+        "day": list(mask_names(d)),
+        "hour": list(mask_names(h))
+    }
+
+
+def get_chart_shen_sha(chart):
+    """计算Chart的神煞"""
+    return shen_sha_for_pillars(chart.year, chart.month, chart.day, chart.hour)
@@ -0,0 +1,70 @@
+"""真太阳时
+
+出生时间按IANA时区（如"Asia/Shanghai"、"America/New_York"）解释为当地钟表时间，
+经zoneinfo换算为UTC（含历史夏令时，如中国1986-1991年的夏令时），再按经度换算为
+地方平太阳时（每度4分钟），最后加上均时差得到真太阳时。
+
+均时差在导入时按一年中的第几天预先算成表（EQUATION_OF_TIME），每次计算只查表，
+不做三角运算；公式误差约半分钟。
+"""
+import datetime
+import math
+from functools import lru_cache
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# 节气表、日柱使用的北京时间（固定UTC+8，不含夏令时）
+BEIJING_OFFSET = datetime.timedelta(hours=8)
+
+
+def _equation_of_time(day_of_year):
+    """均时差（分钟，真太阳时 - 平太阳时），Spencer公式"""
+    b = 2 * math.pi * (day_of_year - 1) / 365
+    return 229.18 * (0.000075 + 0.001868 * math.cos(b) - 0.032077 * math.sin(b)
+                     - 0.014615 * math.cos(2 * b) - 0.040849 * math.sin(2 * b))
+
+
+# EQUATION_OF_TIME[一年中的第几天 - 1]，以timedelta保存，共366天
+EQUATION_OF_TIME = tuple(
+    datetime.timedelta(minutes=_equation_of_time(day)) for day in range(1, 367)
+)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """按名称获取时区，未知时区抛出ValueError"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f'未知时区: {name}') from None
+
+
+def to_utc(dt, timezone):
+    """把当地钟表时间转换为UTC，返回无tzinfo的datetime
+
+    dt无tzinfo时按timezone解释（夏令时重叠的时刻取较早者），有tzinfo时以其为准
+    """
+    if dt.tzinfo is not None:
+        return dt.replace(tzinfo=None) - dt.utcoffset()
+    return dt - get_zone(timezone).utcoffset(dt)
+
+
+def to_beijing(dt, timezone):
+    """转换为北京时间（UTC+8），返回无tzinfo的datetime"""
+    return to_utc(dt, timezone) + BEIJING_OFFSET
+
+
+def equation_of_time(date):
+    """某日的均时差（timedelta）"""
+    return EQUATION_OF_TIME[date.toordinal() - datetime.date(date.year, 1, 1).toordinal()]
+
+
+def local_mean_time(utc_dt, longitude):
+    """UTC时间换算为地方平太阳时（东经为正）"""
+    return utc_dt + datetime.timedelta(minutes=longitude * 4)
+
+
+def true_solar_time(dt, timezone, longitude):
+    """当地钟表时间换算为真太阳时（无tzinfo的datetime）"""
+    mean_time = local_mean_time(to_utc(dt, timezone), longitude)
+    return mean_time + equation_of_time(mean_time)
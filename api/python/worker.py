@@ -0,0 +1,96 @@
+"""常驻八字计算进程
+
+启动一次即加载sxtwl与各类表，之后通过stdin/stdout按行收发JSON：
+
+    请求: {"id": 1, "userData": {...}}      响应: {"id": 1, "chart": {...}}
+    请求: {"id": 2, "userDataList": [...]}  响应: {"id": 2, "charts": [...]}
+    请求: {"id": 3, "ping": true}           响应: {"id": 3, "pong": true}
+    请求: {"id": 4, "stats": true}          响应: {"id": 4, "cache": {...}}
+
+userData/userDataList请求可附带 "fields": ["年柱", ...]，只计算并返回这些字段。
+
+出错时响应 {"id": ..., "error": ..., "details": ...}。进程就绪后先输出 {"ready": true}。
+"""
+import json
+import os
+import sys
+
+# 添加当前目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from bazi_with_sxtwl import calculate_bazi_many, get_day_record, prewarm_day_cache_from_env
+from chart_cache import cached_calculate_bazi, chart_cache
+from disk_cache import disk_cache
+from chart_input import ChartInputError, parse_fields, parse_user_data, parse_user_data_list
+
+# 按BAZI_PREWARM_YEARS预热日缓存
+prewarm_day_cache_from_env()
+
+
+def handle_message(message):
+    """处理一条请求并返回响应字典"""
+    request_id = message.get('id')
+
+    if message.get('ping'):
+        return {'id': request_id, 'pong': True, 'pid': os.getpid()}
+
+    if message.get('stats'):
+        return {
+            'id': request_id,
+            'cache': chart_cache.stats(),
+            'diskCache': disk_cache.stats() if disk_cache is not None else None,
+            'dayCache': get_day_record.cache_info()._asdict()
+        }
+
+    try:
+        fields = parse_fields(message.get('fields'))
+    except ChartInputError as e:
+        return {'id': request_id, 'error': str(e), 'status': 400}
+
+    if 'userDataList' in message:
+        try:
+            records = parse_user_data_list(message['userDataList'])
+        except ChartInputError as e:
+            return {'id': request_id, 'error': str(e), 'index': e.index, 'status': 400}
+        results = calculate_bazi_many(records, fields)
+        return {'id': request_id, 'charts': [{**result, 'source': 'sxtwl'} for result in results]}
+
+    try:
+        birth_time, longitude, timezone, zi_hour = parse_user_data(message.get('userData') or {})
+    except ChartInputError as e:
+        return {'id': request_id, 'error': str(e), 'status': 400}
+
+    result = cached_calculate_bazi(birth_time, longitude, fields, timezone=timezone, zi_hour=zi_hour)
+    return {'id': request_id, 'chart': {**result, 'source': 'sxtwl'}}
+
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """逐行读取请求直到stdin关闭"""
+    stdout.write(json.dumps({'ready': True, 'pid': os.getpid()}) + '\n')
+    stdout.flush()
+
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            message = json.loads(line)
+            request_id = message.get('id')
+            response = handle_message(message)
+        except Exception as e:
+            response = {
+                'id': request_id,
+                'error': '八字计算失败',
+                'details': str(e),
+                'status': 500
+            }
+
+        stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    serve()
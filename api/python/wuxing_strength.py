@@ -0,0 +1,144 @@
+"""五行强弱
+
+八字各字对五行的贡献：
+
+    天干      每字STEM_POINTS分，计入本干五行
+    地支      按藏干的本气、中气、余气分配HIDDEN_STEM_POINTS分
+    月令      以月支所在季节定各五行的旺相休囚死（SEASON_FACTORS，百分比），乘到所有贡献上
+    柱位      天干、地支分别按柱位乘STEM_POSITION_WEIGHTS、BRANCH_POSITION_WEIGHTS（百分比）
+
+日主五行与生日主的五行（印、比劫）之和占总分的比例不低于STRONG_THRESHOLD为身强，否则为身弱。
+用神候选：身强取克泄耗日主的五行（官杀、食伤、财），身弱取生扶日主的五行（印、比劫），
+各按当前得分从低到高排列。
+
+以上权重都在build_tables中展开为按(柱位, 月支, 干或支)查的五元组整数表，
+计算一张命盘只需把八个五元组相加，与权重配置无关。
+"""
+from collections import namedtuple
+
+from bazi_core import BRANCH_HIDDEN_STEMS, STEM_ELEMENT, WUXING
+from interactions import controls, generates
+
+STEM_POINTS = 100
+# 藏干个数 -> 各藏干的分数（本气、中气、余气）
+HIDDEN_STEM_POINTS = {1: (100,), 2: (70, 30), 3: (60, 30, 10)}
+# 旺相休囚死（百分比）
+SEASON_FACTORS = {"旺": 150, "相": 120, "休": 100, "囚": 80, "死": 60}
+# 柱位权重（年、月、日、时，百分比）
+STEM_POSITION_WEIGHTS = (100, 100, 100, 100)
+BRANCH_POSITION_WEIGHTS = (100, 150, 100, 100)
+# 身强的阈值（生扶日主的五行占总分的比例）
+STRONG_THRESHOLD = 0.5
+
+# 地支所在季节的五行：寅卯木、巳午火、申酉金、亥子水、辰戌丑未土
+SEASON_ELEMENT = tuple(WUXING.index(element) for element in "水土木木土火火土金金土水")
+
+
+def season_state(season, element):
+    """season季中element的旺相休囚死"""
+    if element == season:
+        return "旺"
+    if generates(season, element):
+        return "相"
+    if generates(element, season):
+        return "休"
+    if controls(element, season):
+        return "囚"
+    return "死"
+
+
+# SEASON_STATES[月支][五行] = 旺相休囚死
+SEASON_STATES = tuple(tuple(season_state(SEASON_ELEMENT[branch], element) for element in range(5))
+                      for branch in range(12))
+
+# 计分表：STEM_VECTORS[柱位][月支][天干]、BRANCH_VECTORS[柱位][月支][地支]均为五行得分的五元组
+StrengthTables = namedtuple('StrengthTables', ['stem_vectors', 'branch_vectors'])
+
+
+def _vector(points_by_element, factors, weight):
+    return tuple(round(points_by_element[element] * factors[element] * weight / 10000) for element in range(5))
+
+
+def build_tables(stem_points=STEM_POINTS, hidden_stem_points=HIDDEN_STEM_POINTS, season_factors=SEASON_FACTORS,
+                 stem_position_weights=STEM_POSITION_WEIGHTS, branch_position_weights=BRANCH_POSITION_WEIGHTS):
+    """按权重配置展开计分表"""
+    stem_points_by_element = []
+    for stem in range(10):
+        points = [0] * 5
+        points[STEM_ELEMENT[stem]] = stem_points
+        stem_points_by_element.append(points)
+
+    branch_points_by_element = []
+    for hidden in BRANCH_HIDDEN_STEMS:
+        points = [0] * 5
+        for stem, stem_share in zip(hidden, hidden_stem_points[len(hidden)]):
+            points[STEM_ELEMENT[stem]] += stem_share
+        branch_points_by_element.append(points)
+
+    factors = [[season_factors[state] for state in states] for states in SEASON_STATES]
+    stem_vectors = tuple(
+        tuple(tuple(_vector(points, factors[month], weight) for points in stem_points_by_element)
+              for month in range(12))
+        for weight in stem_position_weights
+    )
+    branch_vectors = tuple(
+        tuple(tuple(_vector(points, factors[month], weight) for points in branch_points_by_element)
+              for month in range(12))
+        for weight in branch_position_weights
+    )
+    return StrengthTables(stem_vectors, branch_vectors)
+
+
+DEFAULT_TABLES = build_tables()
+
+# 日主五行 -> 生扶日主的五行（比劫、印）
+SUPPORT_ELEMENTS = tuple((element, (element - 1) % 5) for element in range(5))
+# 日主五行 -> 身强、身弱时的用神候选（按官杀、食伤、财与印、比劫的顺序）
+STRONG_CANDIDATES = tuple(((element - 2) % 5, (element + 1) % 5, (element + 2) % 5) for element in range(5))
+WEAK_CANDIDATES = tuple(((element - 1) % 5, element) for element in range(5))
+
+# 计算结果：scores为五行得分（按WUXING顺序），yong_shen为用神候选的五行下标
+WuXingStrength = namedtuple('WuXingStrength', [
+    'month_branch', 'day_element', 'scores', 'support_ratio', 'strong', 'yong_shen'
+])
+
+
+def wu_xing_strength(year, month, day, hour, tables=DEFAULT_TABLES):
+    """计算四柱（bazi_core.Pillar）的五行强弱"""
+    month_branch = month.branch
+    wood = fire = earth = metal = water = 0
+    for position, pillar in enumerate((year, month, day, hour)):
+        for vector in (tables.stem_vectors[position][month_branch][pillar.stem],
+                       tables.branch_vectors[position][month_branch][pillar.branch]):
+            wood += vector[0]
+            fire += vector[1]
+            earth += vector[2]
+            metal += vector[3]
+            water += vector[4]
+    scores = (wood, fire, earth, metal, water)
+
+    day_element = STEM_ELEMENT[day.stem]
+    own, resource = SUPPORT_ELEMENTS[day_element]
+    total = wood + fire + earth + metal + water
+    support_ratio = round((scores[own] + scores[resource]) / total, 3) if total else 0.0
+    strong = support_ratio >= STRONG_THRESHOLD
+    candidates = (STRONG_CANDIDATES if strong else WEAK_CANDIDATES)[day_element]
+    yong_shen = tuple(sorted(candidates, key=scores.__getitem__))
+    return WuXingStrength(month_branch, day_element, scores, support_ratio, strong, yong_shen)
+
+
+def strength_to_dict(strength):
+    """序列化为命盘的wuXingStrength字段"""
+    return {
+        "scores": dict(zip(WUXING, strength.scores)),
+        "season": dict(zip(WUXING, SEASON_STATES[strength.month_branch])),
+        "dayMaster": WUXING[strength.day_element],
+        "supportRatio": strength.support_ratio,
+        "strength": "身强" if strength.strong else "身弱",
+        "yongShen": [WUXING[element] for element in strength.yong_shen]
+    }
+
+
+def get_chart_wu_xing_strength(chart):
+    """计算Chart的五行强弱"""
+    return strength_to_dict(wu_xing_strength(chart.year, chart.month, chart.day, chart.hour))
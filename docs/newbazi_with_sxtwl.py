@@ -1,8 +1,13 @@
 import datetime
+import os
 import sys
 import json
 from typing import Dict
-import sxtwl  # 直接导入整个sxtwl模块
+
+# 节气表位于 api/python/jieqi.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api', 'python'))
+from jieqi import get_jie_table, to_minutes
+from solar_time import to_beijing, true_solar_time
 
 TIANGAN = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
 DIZHI = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
@@ -31,53 +36,26 @@ def get_hour_ganzhi(day_gan, hour_zhi):
     index = DIZHI.index(hour_zhi)
     return TIANGAN[(base[day_gan] + index) % 10] + DIZHI[index]
 
-def get_solar_terms(year):
-    lunar = sxtwl.Lunar()  # 使用正确的模块引用方式
-    terms = {}
-    for i in range(24):
-        jd = lunar.getJieQiJD(year, i)
-        dt = lunar.JD2DD(jd)
-        name = lunar.getJieQiName(i)
-        terms[name] = dt
-    return terms
-
-def determine_lunar_month(dt, solar_terms):
-    ranges = [
-        ("立春", "惊蛰", 1), ("惊蛰", "清明", 2), ("清明", "立夏", 3),
-        ("立夏", "芒种", 4), ("芒种", "小暑", 5), ("小暑", "立秋", 6),
-        ("立秋", "白露", 7), ("白露", "寒露", 8), ("寒露", "立冬", 9),
-        ("立冬", "大雪", 10), ("大雪", "小寒", 11), ("小寒", "立春", 12)
-    ]
-    for start, end, month_number in ranges:
-        if solar_terms[start] <= dt < solar_terms[end]:
-            return month_number
-    return 12
-
-def get_month_ganzhi_named(year_gan, month_number):
-    named_start_gan_map = {
-        '甲': '丙', '己': '丙',
-        '乙': '戊', '庚': '戊',
-        '丙': '庚', '辛': '庚',
-        '丁': '壬', '壬': '壬',
-        '戊': '甲', '癸': '甲'
-    }
-    start_gan = named_start_gan_map[year_gan]
-    gan_index = (TIANGAN.index(start_gan) + month_number - 1) % 10
-    zhi_index = (2 + month_number - 1) % 12
-    return TIANGAN[gan_index] + DIZHI[zhi_index]
-
 def calculate_bazi(dt: datetime.datetime, longitude: float) -> Dict[str, str]:
-    # 真太阳时校正（简化版本）
-    local_minutes = longitude * 4
-    delta = datetime.timedelta(minutes=local_minutes - 120 * 4)
-    true_dt = dt + delta
-
-    solar_terms = get_solar_terms(dt.year)
-    year = dt.year if dt >= solar_terms["立春"] else dt.year - 1
-    year_gz = ganzhi_by_index((year - 1864) % 60)
-
-    lunar_month = determine_lunar_month(dt, solar_terms)
-    month_gz = get_month_ganzhi_named(year_gz[0], lunar_month)
+    if dt.tzinfo is None:
+        # 真太阳时校正（简化版本），dt视为北京时间
+        local_minutes = longitude * 4
+        delta = datetime.timedelta(minutes=local_minutes - 120 * 4)
+        true_dt = dt + delta
+        beijing_dt = dt
+    else:
+        # 带时区（如ISO字符串中的+08:00），按UTC换算并计入均时差
+        true_dt = true_solar_time(dt, None, longitude)
+        beijing_dt = to_beijing(dt, None)
+        dt = dt.replace(tzinfo=None)
+
+    # 年柱、月柱：在预计算的节气表中二分查找
+    indices = get_jie_table().pillar_indices(to_minutes(beijing_dt))
+    if indices is None:
+        raise ValueError(f'出生时间超出节气表范围（1800-2200年）: {beijing_dt}')
+    year_index, month_index = indices
+    year_gz = ganzhi_by_index(year_index)
+    month_gz = ganzhi_by_index(month_index)
 
     base_date = datetime.datetime(1900, 1, 1)
     day_index = (dt - base_date).days + 10
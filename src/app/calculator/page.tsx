@@ -142,7 +142,10 @@ export default function Calculator() {
           : selectedCity ? selectedCity.name : '',
         longitude: showCustomLocation 
           ? parseFloat(customLongitude) 
-          : selectedCity ? parseFloat(selectedCity.lng) : 0
+          : selectedCity ? parseFloat(selectedCity.lng) : 0,
+        // 中国城市按Asia/Shanghai换算真太阳时（含1986-1991年夏令时与均时差）；
+        // 城市数据只有国家代码，其他国家与自定义经度无法确定时区，仍按北京时间只做经度校正
+        timezone: !showCustomLocation && selectedCity?.country === 'CN' ? 'Asia/Shanghai' : undefined
       };
 
       // 调用 SXTWL API 进行八字排盘
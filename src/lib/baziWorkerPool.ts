@@ -0,0 +1,236 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import * as path from 'path';
+import * as readline from 'readline';
+
+/**
+ * 常驻Python八字计算进程池
+ * 每个子进程运行 api/python/worker.py，启动时加载一次sxtwl，之后按行收发JSON
+ */
+
+const WORKER_SCRIPT = path.join(process.cwd(), 'api', 'python', 'worker.py');
+const PYTHON_BIN = process.env.BAZI_PYTHON_BIN || 'python3';
+const POOL_SIZE = Math.max(1, parseInt(process.env.BAZI_WORKER_COUNT || '2', 10) || 2);
+const REQUEST_TIMEOUT_MS = 10000; // 单次计算超时
+const HEALTH_CHECK_INTERVAL_MS = 15000; // 健康检查间隔
+const HEALTH_CHECK_TIMEOUT_MS = 5000; // 健康检查超时
+const RESTART_DELAY_MS = 500; // 进程退出后的重启延迟
+
+export class BaziWorkerError extends Error {
+  status: number;
+  details?: string;
+
+  constructor(message: string, status = 500, details?: string) {
+    super(message);
+    this.name = 'BaziWorkerError';
+    this.status = status;
+    this.details = details;
+  }
+}
+
+interface PendingRequest {
+  resolve: (value: any) => void;
+  reject: (reason: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+class BaziWorker {
+  private proc: ChildProcessWithoutNullStreams | null = null;
+  private pending = new Map<number, PendingRequest>();
+  private nextId = 1;
+  private ready: Promise<void> | null = null;
+  private healthTimer: NodeJS.Timeout | null = null;
+  private stopped = false;
+  private lastResponseAt = 0;
+
+  constructor(private readonly index: number) {
+    this.start();
+  }
+
+  get load(): number {
+    return this.pending.size;
+  }
+
+  private start() {
+    const proc = spawn(PYTHON_BIN, [WORKER_SCRIPT], { stdio: ['pipe', 'pipe', 'pipe'] });
+    this.proc = proc;
+
+    this.ready = new Promise<void>((resolve, reject) => {
+      const lines = readline.createInterface({ input: proc.stdout });
+      let isReady = false;
+
+      lines.on('line', (line) => {
+        let message: any;
+        try {
+          message = JSON.parse(line);
+        } catch (error) {
+          console.error(`八字进程#${this.index} 输出无法解析:`, line);
+          return;
+        }
+        this.lastResponseAt = Date.now();
+
+        if (!isReady && message.ready) {
+          isReady = true;
+          resolve();
+          return;
+        }
+        this.settle(message);
+      });
+
+      proc.once('exit', (code, signal) => {
+        if (!isReady) {
+          reject(new BaziWorkerError('八字计算进程启动失败', 500, `exit ${code ?? signal}`));
+        }
+      });
+      proc.once('error', (error) => {
+        if (!isReady) {
+          reject(new BaziWorkerError('八字计算进程启动失败', 500, error.message));
+        }
+      });
+    });
+    // 避免未被等待的启动失败触发unhandledRejection
+    this.ready.catch(() => undefined);
+
+    proc.stderr.on('data', (chunk) => {
+      console.error(`八字进程#${this.index} stderr:`, chunk.toString());
+    });
+
+    proc.once('exit', (code, signal) => this.handleExit(proc, code ?? signal));
+    // 找不到Python（ENOENT）等启动错误，以及进程退出后写入stdin（EPIPE），
+    // 未监听时会作为未处理的'error'事件使Node进程崩溃
+    proc.on('error', (error) => this.handleExit(proc, error.message));
+    proc.stdin.on('error', (error) => this.handleExit(proc, error.message));
+
+    if (this.healthTimer) {
+      clearInterval(this.healthTimer);
+    }
+    this.healthTimer = setInterval(() => this.checkHealth(), HEALTH_CHECK_INTERVAL_MS);
+    this.healthTimer.unref();
+  }
+
+  /** 进程退出或出错：拒绝未完成的请求并延迟重启，同一进程只处理一次 */
+  private handleExit(proc: ChildProcessWithoutNullStreams, reason: unknown) {
+    if (this.proc !== proc) {
+      return;
+    }
+    console.error(`八字进程#${this.index} 已退出:`, reason);
+    this.proc = null;
+    proc.kill('SIGKILL');
+    this.failAll(new BaziWorkerError('八字计算进程意外退出'));
+    if (!this.stopped) {
+      setTimeout(() => this.start(), RESTART_DELAY_MS);
+    }
+  }
+
+  private settle(message: any) {
+    const request = this.pending.get(message.id);
+    if (!request) {
+      return;
+    }
+    this.pending.delete(message.id);
+    clearTimeout(request.timer);
+
+    if (message.error) {
+      request.reject(new BaziWorkerError(message.error, message.status || 500, message.details));
+    } else {
+      request.resolve(message);
+    }
+  }
+
+  private failAll(error: Error) {
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(error);
+    }
+    this.pending.clear();
+  }
+
+  private async checkHealth() {
+    try {
+      await this.ready;
+    } catch {
+      return; // 启动失败由退出处理重启
+    }
+    // 有请求在处理时不发ping：ping会排在长批量之后而超时，这些请求由各自的超时处理；
+    // 最近一个检查周期内有过响应也说明进程存活
+    if (!this.proc || this.pending.size > 0 || Date.now() - this.lastResponseAt < HEALTH_CHECK_INTERVAL_MS) {
+      return;
+    }
+    const startedAt = Date.now();
+    try {
+      await this.send({ ping: true }, HEALTH_CHECK_TIMEOUT_MS);
+    } catch (error) {
+      if (this.lastResponseAt >= startedAt) {
+        return; // ping排在其他请求之后，但进程仍有响应
+      }
+      console.error(`八字进程#${this.index} 健康检查失败，正在重启:`, error);
+      this.proc?.kill('SIGKILL');
+    }
+  }
+
+  async send(payload: Record<string, unknown>, timeoutMs = REQUEST_TIMEOUT_MS): Promise<any> {
+    await this.ready;
+    const proc = this.proc;
+    if (!proc) {
+      throw new BaziWorkerError('八字计算进程不可用');
+    }
+
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new BaziWorkerError('八字计算超时', 504));
+      }, timeoutMs);
+
+      this.pending.set(id, { resolve, reject, timer });
+      proc.stdin.write(JSON.stringify({ ...payload, id }) + '\n');
+    });
+  }
+
+  stop() {
+    this.stopped = true;
+    if (this.healthTimer) {
+      clearInterval(this.healthTimer);
+    }
+    this.proc?.kill();
+  }
+}
+
+export class BaziWorkerPool {
+  private workers: BaziWorker[];
+
+  constructor(size = POOL_SIZE) {
+    this.workers = Array.from({ length: size }, (_, i) => new BaziWorker(i));
+  }
+
+  /** 选择当前排队请求最少的进程 */
+  private pick(): BaziWorker {
+    return this.workers.reduce((best, worker) => (worker.load < best.load ? worker : best));
+  }
+
+  /** fields为只需返回的字段（如 ['年柱', '月柱', '日柱', '时柱']），省略时返回全部 */
+  async calculate(userData: Record<string, unknown>, fields?: string[]): Promise<Record<string, unknown>> {
+    const response = await this.pick().send({ userData, fields });
+    return response.chart;
+  }
+
+  async calculateMany(userDataList: Record<string, unknown>[], fields?: string[]): Promise<Record<string, unknown>[]> {
+    const response = await this.pick().send({ userDataList, fields });
+    return response.charts;
+  }
+
+  stop() {
+    this.workers.forEach((worker) => worker.stop());
+  }
+}
+
+// 在同一Node进程内复用进程池（开发模式热重载时同样复用）
+const globalWithPool = global as typeof globalThis & {
+  _baziWorkerPool?: BaziWorkerPool;
+};
+
+export function getBaziWorkerPool(): BaziWorkerPool {
+  if (!globalWithPool._baziWorkerPool) {
+    globalWithPool._baziWorkerPool = new BaziWorkerPool();
+  }
+  return globalWithPool._baziWorkerPool;
+}
@@ -3,6 +3,15 @@
  * 使用Python的sxtwl库计算八字
  */
 
+// 干支作用关系
+export interface SxtwlInteraction {
+  // 参与的柱位（大运、流年条目中另有daYun或liuNian）
+  pillars: Array<'year' | 'month' | 'day' | 'hour' | 'daYun' | 'liuNian'>;
+  relation: string;
+  // 合化五行，非合局时为null
+  element: string | null;
+}
+
 // 八字排盘结果类型
 export interface SxtwlBaziChart {
   // 基本四柱
@@ -73,6 +82,24 @@ export interface SxtwlBaziChart {
     diZhi: string;
   };
   
+  // 四柱两两之间及三支的作用关系（五合、相冲、六合、半合、三合、三会、六冲、相刑、相害、相破）
+  // 不在默认输出中，需在fields中请求
+  interactions?: {
+    tianGan: SxtwlInteraction[];
+    diZhi: SxtwlInteraction[];
+  };
+  
+  // 五行强弱：五行得分、月令旺相休囚死、日主五行、生扶日主的比例、身强/身弱、用神候选（得分从低到高）
+  // 不在默认输出中，需在fields中请求
+  wuXingStrength?: {
+    scores: Record<'木' | '火' | '土' | '金' | '水', number>;
+    season: Record<'木' | '火' | '土' | '金' | '水', '旺' | '相' | '休' | '囚' | '死'>;
+    dayMaster: string;
+    supportRatio: number;
+    strength: '身强' | '身弱';
+    yongShen: string[];
+  };
+  
   // 阴历日期
   lunarDate: {
     year: number;
@@ -101,6 +128,10 @@ export interface UserData {
   gender: string;
   location: string;
   longitude: number;
+  // IANA时区（如"Asia/Shanghai"），提供时按该时区及其夏令时换算真太阳时；省略则按北京时间
+  timezone?: string;
+  // 子时规则：civil（默认，按输入日期）、split（早晚子时）、rollover（23点换日）
+  ziHour?: 'civil' | 'split' | 'rollover';
 }
 
 /**
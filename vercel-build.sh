@@ -3,5 +3,11 @@
 # 安装Python依赖
 python3 -m pip install -r requirements.txt
 
+# 校验命盘序列化与json.dumps逐字节一致，不一致时终止构建
+python3 api/python/serializer.py --check 500 || exit 1
+
+# 校验preload写入的磁盘缓存条目能被worker（cached_calculate_bazi）取用，不一致时终止构建
+python3 api/python/disk_cache.py check 200 || exit 1
+
 # 运行Next.js构建
 npm run build 
\ No newline at end of file